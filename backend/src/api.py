@@ -8,7 +8,11 @@ from datetime import datetime
 
 from config import settings
 from database import get_db, get_mongo_collection
-from model_utils import ContentModerator
+from model_utils import get_content_moderator
+from inference_queue import MicroBatcher
+from inference_executor import QueueFullError, get_inference_executor
+from model_sync import get_model_sync
+from startup import startup_profile
 from document_verification import DocumentVerifier, WebScraper
 from auth import get_current_user, get_optional_user
 from integrations import router as integrations_router
@@ -37,9 +41,16 @@ app.add_middleware(
 app.include_router(integrations_router)
 
 # Initialize services
-content_moderator = ContentModerator()
+# Models load during startup, not at import
+content_moderator = get_content_moderator(load=False)
 document_verifier = DocumentVerifier()
 web_scraper = WebScraper()
+toxicity_batcher = MicroBatcher(
+    content_moderator.batch_analyze_toxicity,
+    max_batch_size=settings.MICRO_BATCH_MAX_SIZE,
+    max_wait_ms=settings.MICRO_BATCH_MAX_WAIT_MS,
+    max_queue_size=settings.MICRO_BATCH_MAX_QUEUE
+)
 
 # API Key security
 api_key_header = APIKeyHeader(name=settings.API_KEY_HEADER)
@@ -47,32 +58,56 @@ security = HTTPBearer()
 
 @app.on_event("startup")
 async def startup_event():
+    await content_moderator.initialize()
+    # Create the executor now; in prefork mode this forks the workers before the queues start
+    get_inference_executor()
     await web_scraper.initialize()
+    await toxicity_batcher.start()
+    await get_model_sync().start()
+    startup_profile.log_report()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await toxicity_batcher.stop()
+    await get_model_sync().stop()
     await web_scraper.close()
+    await content_moderator.cleanup()
+    get_inference_executor().shutdown()
 
 @app.get("/")
 async def root():
     """Root endpoint returning API status and model information."""
     return {
         "status": "online",
-        "model_version": settings.MODEL_VERSION,
+        "model_version": content_moderator.model_version,
         "api_version": "1.0.0"
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Inference executor and queue metrics."""
+    return {
+        "executor": get_inference_executor().get_metrics(),
+        "toxicity_queue": toxicity_batcher.get_metrics(),
+        # Counters of the processes doing the inference (the worker processes in prefork mode)
+        **get_inference_executor().get_moderator_metrics(content_moderator),
+        "inference_backend": content_moderator.get_backend_info(),
+        "startup": startup_profile.get_report()
+    }
+
 @app.post("/analyze")
 async def analyze_text(text: str, user: Optional[Dict[str, Any]] = Depends(get_optional_user)):
     """Analyze a single text for toxic content."""
     try:
-        # Analyze text
-        result = content_moderator.analyze_toxicity(text)
+        # Analyze text together with concurrent requests
+        result = await toxicity_batcher.submit(text)
         
         return {
             "status": "success",
             "result": result
         }
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Inference queue is full, retry later")
     except Exception as e:
         logger.error(f"Error analyzing content: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to analyze content: {str(e)}")
@@ -96,6 +131,8 @@ async def verify_document(
             "status": "success",
             "result": result
         }
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Inference queue is full, retry later")
     except Exception as e:
         logger.error(f"Error verifying document: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to verify document: {str(e)}")
@@ -149,7 +186,7 @@ async def verify_information(
         logger.error(f"Error verifying information: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to verify information: {str(e)}")
 
-async def store_verification_result(result: Dict[str, Any]):
+def store_verification_result(result: Dict[str, Any]):
     """Store document verification result in MongoDB."""
     try:
         # Get MongoDB collection
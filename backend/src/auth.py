@@ -1,45 +1,61 @@
 import os
 import json
 import logging
+import threading
 from typing import Optional, Dict, Any
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import firebase_admin
 from firebase_admin import credentials, auth
 
+from startup import startup_profile
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Firebase Admin SDK
+# Firebase Admin SDK is initialized on the first token check, not at import
 cred_path = os.path.join(os.path.dirname(__file__), '../credentials/firebase-admin.json')
+_firebase_lock = threading.Lock()
+_firebase_ready = False
 
-try:
-    if os.path.exists(cred_path):
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-    else:
-        # Use environment variables if file doesn't exist
-        cred_dict = {
-            "type": os.getenv("FIREBASE_TYPE", ""),
-            "project_id": os.getenv("FIREBASE_PROJECT_ID", ""),
-            "private_key_id": os.getenv("FIREBASE_PRIVATE_KEY_ID", ""),
-            "private_key": os.getenv("FIREBASE_PRIVATE_KEY", "").replace('\\n', '\n'),
-            "client_email": os.getenv("FIREBASE_CLIENT_EMAIL", ""),
-            "client_id": os.getenv("FIREBASE_CLIENT_ID", ""),
-            "auth_uri": os.getenv("FIREBASE_AUTH_URI", "https://accounts.google.com/o/oauth2/auth"),
-            "token_uri": os.getenv("FIREBASE_TOKEN_URI", "https://oauth2.googleapis.com/token"),
-            "auth_provider_x509_cert_url": os.getenv("FIREBASE_AUTH_PROVIDER_CERT_URL", "https://www.googleapis.com/oauth2/v1/certs"),
-            "client_x509_cert_url": os.getenv("FIREBASE_CLIENT_CERT_URL", "")
-        }
-        cred = credentials.Certificate(cred_dict)
-        firebase_admin.initialize_app(cred)
-    logger.info("Firebase Admin SDK initialized successfully")
-except Exception as e:
-    logger.error(f"Error initializing Firebase Admin SDK: {str(e)}")
-    # Initialize with default app for development
-    if not firebase_admin._apps:
-        firebase_admin.initialize_app()
+def init_firebase():
+    """Initialize the Firebase Admin SDK once per process"""
+    global _firebase_ready
+    with _firebase_lock:
+        if _firebase_ready:
+            return
+        with startup_profile.measure("firebase"):
+            _initialize_app()
+        _firebase_ready = True
+
+def _initialize_app():
+    try:
+        if os.path.exists(cred_path):
+            cred = credentials.Certificate(cred_path)
+            firebase_admin.initialize_app(cred)
+        else:
+            # Use environment variables if file doesn't exist
+            cred_dict = {
+                "type": os.getenv("FIREBASE_TYPE", ""),
+                "project_id": os.getenv("FIREBASE_PROJECT_ID", ""),
+                "private_key_id": os.getenv("FIREBASE_PRIVATE_KEY_ID", ""),
+                "private_key": os.getenv("FIREBASE_PRIVATE_KEY", "").replace('\\n', '\n'),
+                "client_email": os.getenv("FIREBASE_CLIENT_EMAIL", ""),
+                "client_id": os.getenv("FIREBASE_CLIENT_ID", ""),
+                "auth_uri": os.getenv("FIREBASE_AUTH_URI", "https://accounts.google.com/o/oauth2/auth"),
+                "token_uri": os.getenv("FIREBASE_TOKEN_URI", "https://oauth2.googleapis.com/token"),
+                "auth_provider_x509_cert_url": os.getenv("FIREBASE_AUTH_PROVIDER_CERT_URL", "https://www.googleapis.com/oauth2/v1/certs"),
+                "client_x509_cert_url": os.getenv("FIREBASE_CLIENT_CERT_URL", "")
+            }
+            cred = credentials.Certificate(cred_dict)
+            firebase_admin.initialize_app(cred)
+        logger.info("Firebase Admin SDK initialized successfully")
+    except Exception as e:
+        logger.error(f"Error initializing Firebase Admin SDK: {str(e)}")
+        # Initialize with default app for development
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app()
 
 # Security scheme for Bearer token
 security = HTTPBearer()
@@ -48,6 +64,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     """Validate Firebase ID token and return user info."""
     try:
         token = credentials.credentials
+        init_firebase()
         # Verify the ID token
         decoded_token = auth.verify_id_token(token)
         return {
@@ -72,6 +89,7 @@ async def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials]
     
     try:
         token = credentials.credentials
+        init_firebase()
         # Verify the ID token
         decoded_token = auth.verify_id_token(token)
         return {
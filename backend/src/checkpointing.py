@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+import random
+import shutil
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from weights_io import load_weights, save_weights
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_PREFIX = 'checkpoint-'
+# Best weights so far (ModelTrainer's save_dir/toxic_classifier.safetensors), stored with each checkpoint
+BEST_WEIGHTS_NAME = 'best_model.safetensors'
+
+def _to_cpu(value: Any) -> Any:
+    """Deep copy of a (nested) state dict with every tensor detached onto the CPU"""
+    if isinstance(value, torch.Tensor):
+        return value.detach().to('cpu', copy=True)
+    if isinstance(value, dict):
+        return {key: _to_cpu(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_to_cpu(item) for item in value)
+    return value
+
+def get_rng_state() -> Dict[str, Any]:
+    """Capture every random number generator training draws from"""
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state()
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+def set_rng_state(state: Dict[str, Any]):
+    """Restore generators captured by get_rng_state"""
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+class CheckpointManager:
+    """
+    Periodic, resumable training checkpoints in one directory.
+
+    Each checkpoint is a directory holding the model weights as safetensors and the rest of
+    the training state (optimizer, scheduler, RNG, data position, history) as trainer_state.pt.
+    The state is copied to the CPU on the training thread and written on a background thread,
+    into a temporary directory that is renamed into place, so a crash never leaves a partial
+    checkpoint behind. Only the newest keep_last checkpoints are kept, locally and remotely.
+
+    Uploads are best effort: a failed upload is logged and training goes on, since the local
+    checkpoint is complete and the next save uploads a newer one (close() retries the last).
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        keep_last: int = 3,
+        cloud_storage: Optional[Any] = None,
+        run_id: Optional[str] = None
+    ):
+        """
+        Args:
+            directory: Local directory holding the checkpoints
+            keep_last: Number of checkpoints retained
+            cloud_storage: CloudStorage to mirror checkpoints to (and resume from), if any
+            run_id: Name of this training run in cloud storage (defaults to the directory name)
+        """
+        self.directory = directory
+        self.keep_last = keep_last
+        self.cloud_storage = cloud_storage
+        self.run_id = run_id or os.path.basename(os.path.normpath(directory))
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint')
+        self._pending: Optional[Future] = None
+        # Checkpoints present in cloud storage, oldest first, and the newest one that failed to upload
+        self._uploaded: List[str] = []
+        self._upload_failed: Optional[str] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def list_checkpoints(self) -> List[str]:
+        """Local checkpoint directories, oldest first"""
+        names = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(CHECKPOINT_PREFIX) and not name.endswith('.tmp')
+        )
+        return [os.path.join(self.directory, name) for name in names]
+
+    def latest(self) -> Optional[str]:
+        """Newest complete checkpoint, fetched from cloud storage when there is none locally"""
+        checkpoints = self.list_checkpoints()
+        if checkpoints:
+            return checkpoints[-1]
+        if self.cloud_storage is not None:
+            path = self.cloud_storage.download_latest_checkpoint(self.run_id, self.directory)
+            if path:
+                self._uploaded.append(os.path.basename(path))
+            return path
+        return None
+
+    def save(
+        self,
+        global_step: int,
+        model_state: Dict[str, torch.Tensor],
+        trainer_state: Dict[str, Any],
+        files: Optional[Dict[str, str]] = None
+    ):
+        """
+        Snapshot the state now and write it in the background.
+
+        Waits for the previous write first, so at most one checkpoint is in flight and a
+        failed write surfaces here instead of being lost.
+
+        Args:
+            global_step: Optimizer steps so far; names the checkpoint
+            model_state: Model state dict
+            trainer_state: Everything else needed to resume
+            files: Existing files to include, keyed by their name in the checkpoint. They are
+                hard-linked (or copied) right away, so rewriting a source later does not change it.
+        """
+        self.wait()
+        tmp_path = f"{self._path(global_step)}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name, source in (files or {}).items():
+            try:
+                os.link(source, os.path.join(tmp_path, name))
+            except OSError:
+                shutil.copyfile(source, os.path.join(tmp_path, name))
+
+        model_state = _to_cpu(model_state)
+        trainer_state = _to_cpu(trainer_state)
+        self._pending = self._executor.submit(self._write, global_step, model_state, trainer_state)
+
+    def wait(self):
+        """Block until the checkpoint being written (if any) is complete"""
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def close(self):
+        """Finish the pending write, retry its upload if that failed, and stop the writer thread"""
+        self.wait()
+        if self._upload_failed is not None and os.path.isdir(self._upload_failed):
+            self._upload(self._upload_failed)
+        self._executor.shutdown()
+
+    def clear(self):
+        """Delete every checkpoint of this run, e.g. once it has finished and must not be resumed"""
+        self.wait()
+        for path in self.list_checkpoints():
+            shutil.rmtree(path, ignore_errors=True)
+        if self.cloud_storage is not None:
+            for name in self._uploaded:
+                self.cloud_storage.delete_checkpoint(self.run_id, name)
+        self._uploaded = []
+        self._upload_failed = None
+        logger.info(f"Cleared checkpoints in {self.directory}")
+
+    def _path(self, global_step: int) -> str:
+        return os.path.join(self.directory, f"{CHECKPOINT_PREFIX}{global_step:09d}")
+
+    def _write(self, global_step: int, model_state: Dict[str, torch.Tensor], trainer_state: Dict[str, Any]):
+        path = self._path(global_step)
+        tmp_path = f"{path}.tmp"
+
+        save_weights(model_state, os.path.join(tmp_path, 'model.safetensors'))
+        torch.save(trainer_state, os.path.join(tmp_path, 'trainer_state.pt'))
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump({'global_step': global_step, 'epoch': trainer_state.get('epoch')}, f)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved checkpoint {path}")
+
+        # Only local write failures above are fatal
+        if self.cloud_storage is not None:
+            self._upload(path)
+
+        for stale in self.list_checkpoints()[:-self.keep_last]:
+            shutil.rmtree(stale, ignore_errors=True)
+            logger.info(f"Removed old checkpoint {stale}")
+
+    def _upload(self, path: str):
+        """Mirror a checkpoint to cloud storage and prune old remote ones, logging rather than raising on failure"""
+        try:
+            self.cloud_storage.upload_checkpoint(path, self.run_id)
+        except Exception as e:
+            self._upload_failed = path
+            logger.warning(f"Checkpoint {path} was not uploaded, continuing with the local copy: {str(e)}")
+            return
+        self._upload_failed = None
+        name = os.path.basename(path)
+        if name not in self._uploaded:
+            self._uploaded.append(name)
+
+        # The run's latest pointer now names this checkpoint, so the oldest ones can go
+        stale, self._uploaded = self._uploaded[:-self.keep_last], self._uploaded[-self.keep_last:]
+        for name in stale:
+            self.cloud_storage.delete_checkpoint(self.run_id, name)
+
+    @staticmethod
+    def load(path: str, device: Any = 'cpu') -> Tuple[Dict[str, torch.Tensor], Dict[str, Any]]:
+        """Read a checkpoint back as (model state dict, trainer state)"""
+        model_state, _ = load_weights(os.path.join(path, 'model.safetensors'), device)
+        trainer_state = torch.load(os.path.join(path, 'trainer_state.pt'), map_location='cpu')
+        return model_state, trainer_state
@@ -6,6 +6,10 @@ import json
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 import logging
+import threading
+
+from weights_io import convert_to_safetensors
+from startup import startup_profile
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -60,6 +64,9 @@ class CloudStorage:
         """
         Download model files from Google Cloud Storage.
         
+        torch.save checkpoints are converted to safetensors after download, so every
+        worker on the host can memory-map the same files instead of holding a copy.
+        
         Args:
             version: Model version to download
             target_dir: Local directory to save files
@@ -83,18 +90,31 @@ class CloudStorage:
                     blob.download_to_filename(str(file_path))
                     logger.info(f"Downloaded {blob.name} to {file_path}")
             
+            self._convert_checkpoints(target_path)
             return True
             
         except Exception as e:
             logger.error(f"Error downloading model: {str(e)}")
             return False
     
+    def _convert_checkpoints(self, model_dir: Path):
+        """Write a safetensors copy of every downloaded torch.save checkpoint that lacks one"""
+        for file_path in list(model_dir.glob("**/*.pt")) + list(model_dir.glob("**/pytorch_model.bin")):
+            if file_path.name == "pytorch_model.bin":
+                # Hugging Face from_pretrained looks for model.safetensors in the same directory
+                target = file_path.with_name("model.safetensors")
+            else:
+                target = file_path.with_suffix(".safetensors")
+            if not target.exists():
+                convert_to_safetensors(str(file_path), str(target))
+                logger.info(f"Converted {file_path} to {target}")
+    
     def upload_training_data(self, data_path: str, metadata: Dict[str, Any]) -> str:
         """
         Upload training data with metadata.
         
         Args:
-            data_path: Path to training data file
+            data_path: Path to training data file (.csv, .parquet or .jsonl)
             metadata: Dictionary of metadata about the dataset
         
         Returns:
@@ -102,7 +122,7 @@ class CloudStorage:
         """
         try:
             timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-            blob_path = f"training_data/{timestamp}.csv"
+            blob_path = f"training_data/{timestamp}{Path(data_path).suffix or '.csv'}"
             
             # Upload data file
             blob = self.bucket.blob(blob_path)
@@ -120,6 +140,112 @@ class CloudStorage:
             logger.error(f"Error uploading training data: {str(e)}")
             raise
     
+    def download_training_data(self, blob_path: str, target_path: str) -> str:
+        """
+        Download uploaded training data.
+        
+        Args:
+            blob_path: Cloud storage path returned by upload_training_data
+            target_path: Local file to write
+        
+        Returns:
+            Local path of the downloaded data
+        """
+        try:
+            Path(target_path).parent.mkdir(parents=True, exist_ok=True)
+            self.bucket.blob(blob_path).download_to_filename(target_path)
+            logger.info(f"Downloaded training data {blob_path} to {target_path}")
+            return target_path
+            
+        except Exception as e:
+            logger.error(f"Error downloading training data: {str(e)}")
+            raise
+    
+    def upload_checkpoint(self, checkpoint_dir: str, run_id: str) -> str:
+        """
+        Upload a training checkpoint directory and mark it as the run's latest.
+        
+        Args:
+            checkpoint_dir: Local checkpoint directory
+            run_id: Training run the checkpoint belongs to
+        
+        Returns:
+            Cloud storage prefix of the uploaded checkpoint
+        """
+        try:
+            checkpoint_path = Path(checkpoint_dir)
+            prefix = f"checkpoints/{run_id}/{checkpoint_path.name}"
+            
+            for file_path in checkpoint_path.glob("**/*"):
+                if file_path.is_file():
+                    blob = self.bucket.blob(f"{prefix}/{file_path.relative_to(checkpoint_path)}")
+                    blob.upload_from_filename(str(file_path))
+            
+            # Written last, so it only ever points at a fully uploaded checkpoint
+            self.bucket.blob(f"checkpoints/{run_id}/latest").upload_from_string(checkpoint_path.name)
+            
+            logger.info(f"Uploaded checkpoint {checkpoint_dir} to {prefix}")
+            return prefix
+            
+        except Exception as e:
+            logger.error(f"Error uploading checkpoint: {str(e)}")
+            raise
+    
+    def download_latest_checkpoint(self, run_id: str, target_dir: str) -> Optional[str]:
+        """
+        Download the latest checkpoint of a training run.
+        
+        Args:
+            run_id: Training run
+            target_dir: Local directory to place the checkpoint directory in
+        
+        Returns:
+            Local checkpoint path, or None if the run has no checkpoint
+        """
+        try:
+            latest_blob = self.bucket.blob(f"checkpoints/{run_id}/latest")
+            if not latest_blob.exists():
+                return None
+            name = latest_blob.download_as_text().strip()
+            prefix = f"checkpoints/{run_id}/{name}/"
+            
+            # Download next to the final location and rename, so a partial download is never used
+            target_path = Path(target_dir) / name
+            tmp_path = Path(target_dir) / f"{name}.tmp"
+            for blob in self.bucket.list_blobs(prefix=prefix):
+                file_path = tmp_path / blob.name[len(prefix):]
+                file_path.parent.mkdir(parents=True, exist_ok=True)
+                blob.download_to_filename(str(file_path))
+            os.replace(tmp_path, target_path)
+            
+            logger.info(f"Downloaded checkpoint {prefix} to {target_path}")
+            return str(target_path)
+            
+        except Exception as e:
+            logger.error(f"Error downloading checkpoint: {str(e)}")
+            return None
+    
+    def delete_checkpoint(self, run_id: str, name: str) -> bool:
+        """
+        Delete one checkpoint of a training run.
+        
+        Args:
+            run_id: Training run
+            name: Checkpoint directory name
+        
+        Returns:
+            True if successful, False otherwise
+        """
+        try:
+            for blob in self.bucket.list_blobs(prefix=f"checkpoints/{run_id}/{name}/"):
+                blob.delete()
+            logger.info(f"Deleted checkpoint {run_id}/{name}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error deleting checkpoint: {str(e)}")
+            return False
+    
     def list_model_versions(self) -> List[str]:
         """
         List available model versions.
@@ -161,4 +287,16 @@ class CloudStorage:
             
         except Exception as e:
             logger.error(f"Error deleting model version: {str(e)}")
-            return False 
\ No newline at end of file
+            return False
+
+_cloud_storage: Optional[CloudStorage] = None
+_cloud_storage_lock = threading.Lock()
+
+def get_cloud_storage() -> CloudStorage:
+    """Get the process-wide CloudStorage, connecting to GCS on first use"""
+    global _cloud_storage
+    with _cloud_storage_lock:
+        if _cloud_storage is None:
+            with startup_profile.measure("gcs"):
+                _cloud_storage = CloudStorage()
+        return _cloud_storage
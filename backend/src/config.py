@@ -21,6 +21,70 @@ class Settings(BaseSettings):
     # Cloud storage settings
     GCP_BUCKET_NAME: str = os.getenv("GCP_BUCKET_NAME", "content-moderation-models")
     
+    # Inference settings
+    INFERENCE_BATCH_SIZE: int = int(os.getenv("INFERENCE_BATCH_SIZE", "32"))
+    MICRO_BATCH_MAX_SIZE: int = int(os.getenv("MICRO_BATCH_MAX_SIZE", "16"))
+    MICRO_BATCH_MAX_WAIT_MS: float = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5"))
+    MICRO_BATCH_MAX_QUEUE: int = int(os.getenv("MICRO_BATCH_MAX_QUEUE", "256"))
+    INFERENCE_WORKERS: int = int(os.getenv("INFERENCE_WORKERS", "0"))  # 0 = derive from CPU count
+    INFERENCE_MAX_QUEUE: int = int(os.getenv("INFERENCE_MAX_QUEUE", "64"))
+    # threads: inference threads in each server process; prefork: load models once, fork worker processes
+    INFERENCE_MODE: str = os.getenv("INFERENCE_MODE", "threads")
+    
+    # Moderation categories scored by the multi-label category head
+    MODERATION_CATEGORIES: List[str] = ["vulgar", "cyberbullying", "misinformation"]
+    
+    # Result cache settings (empty RESULT_CACHE_REDIS_URL keeps the cache in-process only)
+    RESULT_CACHE_ENABLED: bool = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_MAX_ENTRIES: int = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000"))
+    RESULT_CACHE_TTL_SECONDS: int = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+    RESULT_CACHE_REDIS_URL: str = os.getenv("RESULT_CACHE_REDIS_URL", "redis://localhost:6379/0")
+    
+    # Near-duplicate decision reuse through the embedding index
+    SEMANTIC_REUSE_ENABLED: bool = os.getenv("SEMANTIC_REUSE_ENABLED", "false").lower() == "true"
+    SEMANTIC_REUSE_THRESHOLD: float = float(os.getenv("SEMANTIC_REUSE_THRESHOLD", "0.97"))
+    SEMANTIC_INDEX_CAPACITY: int = int(os.getenv("SEMANTIC_INDEX_CAPACITY", "20000"))
+    SEMANTIC_INDEX_PATH: str = os.getenv("SEMANTIC_INDEX_PATH", "")
+    
+    # Inference backend: torch, quantized (PyTorch dynamic int8), onnx or onnx-int8
+    INFERENCE_BACKEND: str = os.getenv("INFERENCE_BACKEND", "torch")
+    ONNX_EXPORT_DIR: str = os.getenv("ONNX_EXPORT_DIR", os.path.join(os.path.dirname(__file__), "weights", "onnx"))
+    BACKEND_PARITY_TOLERANCE: float = float(os.getenv("BACKEND_PARITY_TOLERANCE", "0.05"))
+    
+    # Long texts are scored as overlapping token windows pooled with max or mean
+    LONG_TEXT_WINDOW_OVERLAP: int = int(os.getenv("LONG_TEXT_WINDOW_OVERLAP", "128"))
+    LONG_TEXT_MAX_WINDOWS: int = int(os.getenv("LONG_TEXT_MAX_WINDOWS", "64"))
+    LONG_TEXT_POOLING: str = os.getenv("LONG_TEXT_POOLING", "max")
+    LONG_TEXT_EARLY_STOP: bool = os.getenv("LONG_TEXT_EARLY_STOP", "true").lower() == "true"
+    
+    # Early exit from intermediate toxicity classifier layers (requires trained weights/exit_heads)
+    EARLY_EXIT_ENABLED: bool = os.getenv("EARLY_EXIT_ENABLED", "false").lower() == "true"
+    EARLY_EXIT_THRESHOLD: float = float(os.getenv("EARLY_EXIT_THRESHOLD", "0.95"))
+    
+    # Two-stage cascade: the lexical model settles texts outside the uncertain band
+    CASCADE_ENABLED: bool = os.getenv("CASCADE_ENABLED", "false").lower() == "true"
+    CASCADE_APPROVE_BELOW: float = float(os.getenv("CASCADE_APPROVE_BELOW", "0.05"))
+    CASCADE_REJECT_ABOVE: float = float(os.getenv("CASCADE_REJECT_ABOVE", "0.98"))
+    LEXICAL_MODEL_PATH: str = os.getenv("LEXICAL_MODEL_PATH", "")
+    
+    # Blocklist/allowlist precheck (JSON lexicon file; empty disables it), reloaded when the file changes
+    LEXICON_PATH: str = os.getenv("LEXICON_PATH", "")
+    LEXICON_RELOAD_INTERVAL_SECONDS: float = float(os.getenv("LEXICON_RELOAD_INTERVAL_SECONDS", "5"))
+    
+    # LRU of token ids and offsets shared by every head (0 disables it)
+    TOKEN_CACHE_MAX_ENTRIES: int = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "50000"))
+    
+    # Download missing NLTK data at startup; keep false on offline hosts and install it at build time
+    NLTK_AUTO_DOWNLOAD: bool = os.getenv("NLTK_AUTO_DOWNLOAD", "true").lower() == "true"
+    
+    # Training uploads at least this large are streamed from disk instead of tokenized into memory
+    TRAIN_STREAMING_MIN_BYTES: int = int(os.getenv("TRAIN_STREAMING_MIN_BYTES", str(1 << 30)))
+    
+    # Model swaps published by sync_model_weights are picked up by every serving process through Redis
+    # (empty MODEL_SYNC_REDIS_URL leaves other processes on their current weights until restarted)
+    MODEL_SYNC_REDIS_URL: str = os.getenv("MODEL_SYNC_REDIS_URL", "redis://localhost:6379/0")
+    MODEL_SYNC_POLL_SECONDS: float = float(os.getenv("MODEL_SYNC_POLL_SECONDS", "5"))
+    
     # Logging settings
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     LOG_FORMAT: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
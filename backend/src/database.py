@@ -2,10 +2,13 @@ from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from pymongo import MongoClient
-from typing import Generator
+from typing import Generator, Optional
 import os
+import threading
 from dotenv import load_dotenv
 
+from startup import startup_profile
+
 # Load environment variables
 load_dotenv()
 
@@ -18,16 +21,40 @@ POSTGRES_DB = os.getenv("POSTGRES_DB", "content_moderation")
 
 SQLALCHEMY_DATABASE_URL = f"postgresql://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 # MongoDB Configuration
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 MONGO_DB = os.getenv("MONGO_DB", "content_moderation")
 
-mongo_client = MongoClient(MONGO_URI)
-mongo_db = mongo_client[MONGO_DB]
+# Clients are created on first use, so importing this module opens no connections
+_engine = None
+_session_factory = None
+_mongo_client: Optional[MongoClient] = None
+_clients_lock = threading.Lock()
+
+def get_engine():
+    """
+    Get the PostgreSQL engine, creating it on first use.
+    """
+    global _engine, _session_factory
+    with _clients_lock:
+        if _engine is None:
+            with startup_profile.measure("postgres"):
+                _engine = create_engine(SQLALCHEMY_DATABASE_URL)
+                _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+        return _engine
+
+def get_mongo_db():
+    """
+    Get the MongoDB database, connecting on first use.
+    """
+    global _mongo_client
+    with _clients_lock:
+        if _mongo_client is None:
+            with startup_profile.measure("mongodb"):
+                _mongo_client = MongoClient(MONGO_URI)
+        return _mongo_client[MONGO_DB]
 
 # Database dependency
 def get_db() -> Generator:
@@ -35,7 +62,8 @@ def get_db() -> Generator:
     Get database session.
     """
     try:
-        db = SessionLocal()
+        get_engine()
+        db = _session_factory()
         yield db
     finally:
         db.close()
@@ -44,16 +72,17 @@ def get_mongo_collection(collection_name: str):
     """
     Get MongoDB collection.
     """
-    return mongo_db[collection_name]
+    return get_mongo_db()[collection_name]
 
 # Initialize databases
 def init_db() -> None:
     """
     Initialize database tables and indexes.
     """
-    Base.metadata.create_all(bind=engine)
+    Base.metadata.create_all(bind=get_engine())
     
     # Create MongoDB indexes
+    mongo_db = get_mongo_db()
     analysis_collection = mongo_db.analysis_results
     analysis_collection.create_index([("created_at", 1)])
     analysis_collection.create_index([("user_id", 1)])
@@ -69,11 +98,11 @@ def check_db_connection() -> bool:
     """
     try:
         # Check PostgreSQL
-        with engine.connect() as connection:
+        with get_engine().connect() as connection:
             connection.execute("SELECT 1")
         
         # Check MongoDB
-        mongo_client.admin.command('ping')
+        get_mongo_db().client.admin.command('ping')
         
         return True
     except Exception as e:
@@ -0,0 +1,104 @@
+import logging
+import os
+from contextlib import contextmanager, nullcontext
+from typing import Any, List
+
+import torch
+import torch.distributed as dist
+from torch.distributed.algorithms.join import Join
+from torch.nn.parallel import DistributedDataParallel
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def init_distributed(backend: str = 'gloo') -> bool:
+    """
+    Join the process group described by the torchrun environment (RANK, WORLD_SIZE, MASTER_ADDR, ...).
+
+    Returns False without doing anything when the process was not launched by torchrun. Each
+    process gets an equal share of the host's cores so the replicas do not oversubscribe them.
+    """
+    if int(os.environ.get('WORLD_SIZE', '1')) <= 1 or not dist.is_available():
+        return False
+    if not dist.is_initialized():
+        dist.init_process_group(backend=backend)
+
+    local_world_size = int(os.environ.get('LOCAL_WORLD_SIZE', '1'))
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_world_size))
+    logger.info(
+        f"Initialized {backend} process group: rank {get_rank()}/{get_world_size()}, "
+        f"{torch.get_num_threads()} threads per replica"
+    )
+    return True
+
+def cleanup_distributed():
+    """Leave the process group, if any"""
+    if is_distributed():
+        dist.destroy_process_group()
+
+def is_distributed() -> bool:
+    return dist.is_available() and dist.is_initialized()
+
+def get_rank() -> int:
+    return dist.get_rank() if is_distributed() else 0
+
+def get_world_size() -> int:
+    return dist.get_world_size() if is_distributed() else 1
+
+def get_local_rank() -> int:
+    return int(os.environ.get('LOCAL_RANK', '0')) if is_distributed() else 0
+
+def is_main_process() -> bool:
+    return get_rank() == 0
+
+def barrier():
+    """Wait for every replica; a no-op in a single process"""
+    if is_distributed():
+        dist.barrier()
+
+def all_reduce_sum(values: List[float]) -> List[float]:
+    """Sum a list of numbers over all replicas"""
+    if not is_distributed():
+        return values
+    tensor = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor.tolist()
+
+def all_gather_list(values: List[Any]) -> List[Any]:
+    """Concatenate a list of picklable values from all replicas, in rank order"""
+    if not is_distributed():
+        return values
+    gathered = [None] * get_world_size()
+    dist.all_gather_object(gathered, values)
+    return [value for part in gathered for value in part]
+
+def broadcast_object(value: Any) -> Any:
+    """Rank 0's value of a picklable object, on every replica"""
+    if not is_distributed():
+        return value
+    holder = [value]
+    dist.broadcast_object_list(holder, src=0)
+    return holder[0]
+
+def broadcast_module(module: torch.nn.Module):
+    """Overwrite a module's parameters and buffers with rank 0's"""
+    if not is_distributed():
+        return
+    with torch.no_grad():
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            dist.broadcast(tensor.data, src=0)
+
+def wrap_model(module: torch.nn.Module) -> torch.nn.Module:
+    """DistributedDataParallel around a module when distributed, so backward all-reduces gradients"""
+    if not is_distributed():
+        return module
+    device = next(module.parameters()).device
+    return DistributedDataParallel(module, device_ids=[device.index] if device.type == 'cuda' else None)
+
+@contextmanager
+def join(model: torch.nn.Module):
+    """Let replicas with fewer batches (uneven shards) finish an epoch without hanging the others"""
+    context = Join([model]) if isinstance(model, DistributedDataParallel) else nullcontext()
+    with context:
+        yield
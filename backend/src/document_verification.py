@@ -1,9 +1,11 @@
 import os
 import uuid
+import asyncio
 import logging
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from fastapi import UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
 import aiohttp
 import PyPDF2
 import docx
@@ -11,15 +13,14 @@ import magic
 import hashlib
 from io import BytesIO
 
-from model_utils import ContentModerator
-from cloud_storage import CloudStorage
+from model_utils import get_content_moderator
+from cloud_storage import get_cloud_storage
+from inference_executor import QueueFullError, get_inference_executor
 
 logger = logging.getLogger(__name__)
 
 class DocumentVerifier:
     def __init__(self):
-        self.content_moderator = ContentModerator()
-        self.cloud_storage = CloudStorage()
         self.mime = magic.Magic(mime=True)
         self.trusted_sources = [
             "https://www.govinfo.gov",
@@ -29,6 +30,15 @@ class DocumentVerifier:
             "https://www.ftc.gov"
         ]
     
+    @property
+    def content_moderator(self):
+        # Resolved on use so constructing the verifier loads no models
+        return get_content_moderator(load=False)
+
+    @property
+    def cloud_storage(self):
+        return get_cloud_storage()
+
     async def verify_document(self, file: UploadFile) -> Dict[str, Any]:
         """Verify a document for authenticity and detect potential issues"""
         try:
@@ -41,8 +51,8 @@ class DocumentVerifier:
             file_type = self.mime.from_buffer(content)
             
             # Extract metadata and text
-            metadata = self.extract_metadata(file.filename, content, file_type)
-            text_content = self.extract_text(content, file_type)
+            metadata = await run_in_threadpool(self.extract_metadata, file.filename, content, file_type)
+            text_content = await run_in_threadpool(self.extract_text, content, file_type)
             
             # Store file in cloud storage
             file_id = str(uuid.uuid4())
@@ -50,7 +60,9 @@ class DocumentVerifier:
             await self.cloud_storage.upload_file(storage_path, BytesIO(content))
             
             # Analyze content for issues
-            content_analysis = self.content_moderator.analyze_toxicity(text_content)
+            content_analysis = await get_inference_executor().run(
+                self.content_moderator.analyze_toxicity, text_content
+            )
             similarity_results = await self.check_against_trusted_sources(text_content)
             
             # Determine authenticity based on analysis
@@ -73,6 +85,8 @@ class DocumentVerifier:
                 "content_analysis": content_analysis,
                 "storage_path": storage_path
             }
+        except QueueFullError:
+            raise
         except Exception as e:
             logger.error(f"Error verifying document: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Document verification failed: {str(e)}")
@@ -230,7 +244,7 @@ class DocumentVerifier:
                 issues.append("Suspicious modification pattern detected")
         
         # Check content analysis
-        if content_analysis.get("toxicity", 0) > 0.7:
+        if content_analysis.get("toxic_probability", 0) > 0.7:
             issues.append("Document contains potentially harmful content")
         
         # Check similarity results
@@ -254,7 +268,7 @@ class DocumentVerifier:
             confidence += 0.1  # Complete metadata is good
         
         # Adjust based on content analysis
-        toxicity = content_analysis.get("toxicity", 0)
+        toxicity = content_analysis.get("toxic_probability", 0)
         confidence -= toxicity * 0.2  # Higher toxicity reduces confidence
         
         # Adjust based on similarity results
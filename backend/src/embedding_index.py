@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set, Tuple
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class EmbeddingIndex:
+    """Bounded approximate nearest-neighbour index over recent text embeddings"""
+
+    def __init__(self, dim: int, capacity: int = 20000, num_planes: int = 16, seed: int = 0):
+        """
+        Create an empty index.
+
+        Args:
+            dim: Embedding dimension
+            capacity: Maximum number of entries; the oldest entry is evicted first
+            num_planes: Random hyperplanes used to hash embeddings into buckets
+            seed: Seed for the hyperplanes so saved indexes hash identically when reloaded
+        """
+        self.dim = dim
+        self.capacity = capacity
+        self.num_planes = num_planes
+        self.seed = seed
+
+        self._planes = np.random.default_rng(seed).standard_normal((num_planes, dim)).astype(np.float32)
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._signatures = np.zeros(capacity, dtype=np.int64)
+        self._payloads = [None] * capacity
+        self._buckets: Dict[int, Set[int]] = defaultdict(set)
+        self._next = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _signature(self, vector: np.ndarray) -> int:
+        """Random-hyperplane LSH signature of a normalized vector"""
+        bits = (self._planes @ vector) > 0
+        return int(np.dot(bits, 1 << np.arange(self.num_planes)))
+
+    @staticmethod
+    def _normalize(vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def add(self, vector: np.ndarray, payload: Any):
+        """Insert an embedding, evicting the oldest entry when full"""
+        vector = self._normalize(vector)
+        signature = self._signature(vector)
+
+        with self._lock:
+            slot = self._next
+            if self._payloads[slot] is not None:
+                self._buckets[int(self._signatures[slot])].discard(slot)
+            else:
+                self._size += 1
+
+            self._vectors[slot] = vector
+            self._signatures[slot] = signature
+            self._payloads[slot] = payload
+            self._buckets[signature].add(slot)
+            self._next = (slot + 1) % self.capacity
+
+    def query(self, vector: np.ndarray, threshold: float) -> Optional[Tuple[float, Any]]:
+        """
+        Find the most similar stored entry at or above a cosine threshold.
+
+        Probes the vector's own bucket and every bucket one hyperplane flip away.
+
+        Returns:
+            (similarity, payload) of the best match, or None
+        """
+        vector = self._normalize(vector)
+        signature = self._signature(vector)
+        probes = [signature] + [signature ^ (1 << bit) for bit in range(self.num_planes)]
+
+        with self._lock:
+            candidates = [slot for probe in probes for slot in self._buckets.get(probe, ())]
+            if not candidates:
+                return None
+
+            similarities = self._vectors[candidates] @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < threshold:
+                return None
+            return float(similarities[best]), self._payloads[candidates[best]]
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._vectors.fill(0)
+            self._payloads = [None] * self.capacity
+            self._buckets.clear()
+            self._next = 0
+            self._size = 0
+
+    def save(self, path: str, metadata: Optional[Dict[str, Any]] = None):
+        """Persist the index atomically so it can be warm-started"""
+        with self._lock:
+            slots = [slot for slot, payload in enumerate(self._payloads) if payload is not None]
+            # Oldest first, so reloading preserves eviction order
+            slots.sort(key=lambda slot: (slot - self._next) % self.capacity)
+            vectors = self._vectors[slots].copy()
+            payloads = json.dumps([self._payloads[slot] for slot in slots])
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                vectors=vectors,
+                payloads=np.array(payloads),
+                config=np.array(json.dumps({
+                    "dim": self.dim,
+                    "num_planes": self.num_planes,
+                    "seed": self.seed,
+                    "metadata": metadata or {}
+                }))
+            )
+        os.replace(tmp_path, path)
+        logger.info(f"Saved embedding index with {len(slots)} entries to {path}")
+
+    @classmethod
+    def load(cls, path: str, capacity: int = 20000) -> Tuple["EmbeddingIndex", Dict[str, Any]]:
+        """Load a saved index; returns the index and the metadata it was saved with"""
+        with np.load(path) as data:
+            config = json.loads(str(data['config']))
+            vectors = data['vectors']
+            payloads = json.loads(str(data['payloads']))
+
+        index = cls(config['dim'], capacity=capacity, num_planes=config['num_planes'], seed=config['seed'])
+        for vector, payload in zip(vectors[-capacity:], payloads[-capacity:]):
+            index.add(vector, payload)
+
+        logger.info(f"Loaded embedding index with {len(index)} entries from {path}")
+        return index, config['metadata']
@@ -0,0 +1,52 @@
+from typing import List
+
+import torch
+from torch import nn
+
+class CategoryHead(nn.Module):
+    """Multi-label classifier scoring every moderation category from pooled encoder output"""
+
+    def __init__(self, hidden_size: int, categories: List[str], dropout: float = 0.1):
+        super().__init__()
+        self.categories = list(categories)
+        self.dropout = nn.Dropout(dropout)
+        self.classifier = nn.Linear(hidden_size, len(self.categories))
+
+    def forward(self, pooled: torch.Tensor) -> torch.Tensor:
+        """Return one logit per category for each pooled embedding"""
+        return self.classifier(self.dropout(pooled))
+
+    def predict(self, pooled: torch.Tensor) -> torch.Tensor:
+        """Return independent per-category probabilities"""
+        return torch.sigmoid(self.forward(pooled))
+
+def mean_pool(hidden_states: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+    """Average token states, ignoring padding"""
+    mask = attention_mask.unsqueeze(-1).to(hidden_states.dtype)
+    return (hidden_states * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1.0)
+
+def sequence_classification_logits(model: nn.Module, hidden_states: torch.Tensor) -> torch.Tensor:
+    """Apply a DistilBertForSequenceClassification head to precomputed encoder states"""
+    pooled = hidden_states[:, 0]
+    pooled = nn.functional.relu(model.pre_classifier(pooled))
+    return model.classifier(model.dropout(pooled))
+
+class EarlyExitHeads(nn.Module):
+    """Small toxicity classifiers on the [CLS] state of each intermediate encoder layer"""
+
+    def __init__(self, hidden_size: int, num_layers: int, num_labels: int = 2, head_size: int = 128):
+        super().__init__()
+        # The final layer already has the full classifier, so only layers 1..n-1 get an exit
+        self.num_layers = num_layers
+        self.exits = nn.ModuleList([
+            nn.Sequential(
+                nn.Linear(hidden_size, head_size),
+                nn.ReLU(),
+                nn.Linear(head_size, num_labels)
+            )
+            for _ in range(num_layers - 1)
+        ])
+
+    def forward(self, layer_index: int, hidden_states: torch.Tensor) -> torch.Tensor:
+        """Return exit logits for the output of a zero-based intermediate layer"""
+        return self.exits[layer_index](hidden_states[:, 0])
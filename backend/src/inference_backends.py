@@ -0,0 +1,188 @@
+import copy
+import logging
+import os
+from typing import Callable, Dict
+
+import torch
+from torch import nn
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Part of every export's file name; bump it when the export changes so older files are not reused
+EXPORT_REVISION = 2
+
+class TorchBackend:
+    """Eager fp32 PyTorch execution of the shared encoder and the sentiment model"""
+
+    name = "torch"
+
+    def __init__(self, encoder: nn.Module, sentiment_model: nn.Module):
+        self.encoder = encoder
+        self.sentiment_model = sentiment_model
+
+    def encode(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        """Return the encoder's last hidden state"""
+        return self.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+    def sentiment_logits(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        """Return sentiment classifier logits"""
+        return self.sentiment_model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+class QuantizedTorchBackend(TorchBackend):
+    """PyTorch dynamic int8 quantization of every Linear layer"""
+
+    name = "quantized"
+
+    def __init__(self, encoder: nn.Module, sentiment_model: nn.Module):
+        # Quantize copies so the fp32 modules stay usable for reloading weights and training
+        super().__init__(
+            torch.quantization.quantize_dynamic(copy.deepcopy(encoder).cpu(), {nn.Linear}, dtype=torch.qint8),
+            torch.quantization.quantize_dynamic(copy.deepcopy(sentiment_model).cpu(), {nn.Linear}, dtype=torch.qint8)
+        )
+
+    def encode(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return super().encode(input_ids.cpu(), attention_mask.cpu()).to(input_ids.device)
+
+    def sentiment_logits(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return super().sentiment_logits(input_ids.cpu(), attention_mask.cpu()).to(input_ids.device)
+
+class _OutputSelector(nn.Module):
+    """Expose one named output of a Hugging Face model as a plain tensor for ONNX export"""
+
+    def __init__(self, model: nn.Module, output_name: str):
+        super().__init__()
+        self.model = model
+        self.output_name = output_name
+
+    def forward(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return getattr(self.model(input_ids=input_ids, attention_mask=attention_mask), self.output_name)
+
+class OnnxBackend:
+    """ONNX Runtime execution of exported encoder and sentiment graphs, optionally int8 quantized"""
+
+    name = "onnx"
+
+    def __init__(self, encoder: nn.Module, sentiment_model: nn.Module, export_dir: str, tag: str, quantize: bool = False):
+        """
+        Export both models (once per tag) and open inference sessions.
+
+        Args:
+            encoder: Shared DistilBERT encoder
+            sentiment_model: Sentiment sequence classifier
+            export_dir: Directory holding exported graphs
+            tag: Model version tag used in file names so new weights trigger a fresh export
+            quantize: Apply ONNX Runtime dynamic int8 quantization to the exported graphs
+        """
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise RuntimeError("The onnx inference backend requires the onnxruntime package") from e
+
+        if quantize:
+            self.name = "onnx-int8"
+
+        os.makedirs(export_dir, exist_ok=True)
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = torch.get_num_threads()
+
+        self.encoder_session = onnxruntime.InferenceSession(
+            self._export(encoder, 'last_hidden_state', os.path.join(export_dir, f"encoder-{tag}-r{EXPORT_REVISION}.onnx"), quantize),
+            options,
+            providers=['CPUExecutionProvider']
+        )
+        self.sentiment_session = onnxruntime.InferenceSession(
+            self._export(sentiment_model, 'logits', os.path.join(export_dir, f"sentiment-{tag}-r{EXPORT_REVISION}.onnx"), quantize),
+            options,
+            providers=['CPUExecutionProvider']
+        )
+
+    @staticmethod
+    def _export(model: nn.Module, output_name: str, path: str, quantize: bool) -> str:
+        """Export a model to ONNX with dynamic batch and sequence axes, reusing an existing export"""
+        target = path.replace('.onnx', '-int8.onnx') if quantize else path
+        if os.path.exists(target):
+            return target
+
+        if not os.path.exists(path):
+            dummy_ids = torch.ones((1, 8), dtype=torch.long)
+            dummy_mask = torch.ones((1, 8), dtype=torch.long)
+            torch.onnx.export(
+                _OutputSelector(copy.deepcopy(model).cpu().eval(), output_name),
+                (dummy_ids, dummy_mask),
+                path,
+                input_names=['input_ids', 'attention_mask'],
+                output_names=[output_name],
+                dynamic_axes={
+                    'input_ids': {0: 'batch', 1: 'sequence'},
+                    'attention_mask': {0: 'batch', 1: 'sequence'},
+                    # Hidden states keep the input's sequence axis; logits have none
+                    output_name: {0: 'batch', 1: 'sequence'} if output_name == 'last_hidden_state' else {0: 'batch'}
+                },
+                opset_version=14
+            )
+            logger.info(f"Exported ONNX graph to {path}")
+
+        if quantize:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+            quantize_dynamic(path, target, weight_type=QuantType.QInt8)
+            logger.info(f"Quantized ONNX graph to {target}")
+
+        return target
+
+    @staticmethod
+    def _run(session, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        output = session.run(None, {
+            'input_ids': input_ids.cpu().numpy(),
+            'attention_mask': attention_mask.cpu().numpy()
+        })[0]
+        return torch.from_numpy(output).to(input_ids.device)
+
+    def encode(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self._run(self.encoder_session, input_ids, attention_mask)
+
+    def sentiment_logits(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        return self._run(self.sentiment_session, input_ids, attention_mask)
+
+def create_backend(name: str, encoder: nn.Module, sentiment_model: nn.Module, export_dir: str, tag: str):
+    """Build the inference backend selected by configuration"""
+    if name == "torch":
+        return TorchBackend(encoder, sentiment_model)
+    if name == "quantized":
+        return QuantizedTorchBackend(encoder, sentiment_model)
+    if name in ("onnx", "onnx-int8"):
+        return OnnxBackend(encoder, sentiment_model, export_dir, tag, quantize=name == "onnx-int8")
+    raise ValueError(f"Unknown inference backend: {name}")
+
+def check_parity(
+    reference: TorchBackend,
+    candidate,
+    toxicity_head: Callable[[torch.Tensor], torch.Tensor],
+    inputs: Dict[str, torch.Tensor]
+) -> Dict[str, float]:
+    """
+    Compare a candidate backend against the eager model on sample texts.
+
+    Args:
+        reference: Eager backend
+        candidate: Backend under test
+        toxicity_head: Maps encoder hidden states to toxicity logits
+        inputs: Padded input_ids and attention_mask of the sample texts, on the model's device
+
+    Returns:
+        Largest absolute probability difference and decision agreement for toxicity and sentiment
+    """
+    results = {}
+
+    with torch.no_grad():
+        for task, run in (
+            ('toxicity', lambda backend: toxicity_head(backend.encode(inputs['input_ids'], inputs['attention_mask']))),
+            ('sentiment', lambda backend: backend.sentiment_logits(inputs['input_ids'], inputs['attention_mask']))
+        ):
+            expected = torch.softmax(run(reference).float(), dim=1)
+            actual = torch.softmax(run(candidate).float(), dim=1)
+            results[f"{task}_max_abs_diff"] = (expected - actual).abs().max().item()
+            results[f"{task}_agreement"] = (expected.argmax(dim=1) == actual.argmax(dim=1)).float().mean().item()
+
+    return results
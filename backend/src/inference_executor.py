@@ -0,0 +1,276 @@
+import asyncio
+import functools
+import gc
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import settings
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class QueueFullError(Exception):
+    """Raised when inference work is rejected because the queue is full"""
+
+def available_cpus() -> int:
+    """Number of CPUs this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+class InferenceExecutor:
+    """Bounded thread pool that keeps blocking inference off the event loop"""
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue_size: Optional[int] = None):
+        """
+        Create the executor.
+
+        Args:
+            max_workers: Number of inference threads, defaults to half the available CPUs
+            max_queue_size: Number of calls allowed to wait for a free worker
+        """
+        cpus = available_cpus()
+        self.max_workers = max_workers or settings.INFERENCE_WORKERS or max(1, cpus // 2)
+        self.max_queue_size = max_queue_size if max_queue_size is not None else settings.INFERENCE_MAX_QUEUE
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+        # Split the cores between workers so intra-op threads do not oversubscribe
+        try:
+            import torch
+            torch.set_num_threads(max(1, cpus // self.max_workers))
+        except ImportError:
+            pass
+
+        logger.info(f"Inference executor started with {self.max_workers} workers")
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking call on the pool, failing fast when the queue is full"""
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue_size:
+                self._rejected += 1
+                raise QueueFullError("Inference queue is full")
+            self._pending += 1
+
+        try:
+            return await self._dispatch(fn, args, kwargs)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._completed += 1
+
+    def _dispatch(self, fn: Callable, args: tuple, kwargs: dict) -> "asyncio.Future":
+        return asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            functools.partial(fn, *args, **kwargs)
+        )
+
+    def get_moderator_metrics(self, moderator) -> Dict[str, Any]:
+        """Moderation counters of the processes running inference, keyed by /metrics section"""
+        return moderator.get_metrics()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of calls waiting for a free worker"""
+        return max(0, self._pending - self.max_workers)
+
+    def get_metrics(self) -> Dict[str, int]:
+        """Get executor load metrics"""
+        with self._lock:
+            return {
+                "mode": "threads",
+                "workers": self.max_workers,
+                "in_flight": min(self._pending, self.max_workers),
+                "queue_depth": max(0, self._pending - self.max_workers),
+                "max_queue_size": self.max_queue_size,
+                "completed": self._completed,
+                "rejected": self._rejected
+            }
+
+    def shutdown(self):
+        """Stop accepting work and wait for running calls to finish"""
+        self._executor.shutdown(wait=True)
+
+def _init_prefork_worker(num_threads: int):
+    """Configure a freshly forked inference worker"""
+    import torch
+    torch.set_num_threads(num_threads)
+
+def _worker_pid(_: int) -> int:
+    return os.getpid()
+
+def _call_moderator(method_name: str, args: tuple, kwargs: dict) -> Tuple[Any, int, Dict[str, Any]]:
+    """
+    Run a ContentModerator method on the copy inherited from the parent at fork time.
+
+    Returns:
+        The result, plus this worker's pid and metrics so the parent can report them
+    """
+    from model_utils import get_content_moderator
+    moderator = get_content_moderator()
+    result = getattr(moderator, method_name)(*args, **kwargs)
+    return result, os.getpid(), moderator.get_metrics()
+
+def _merge_metrics(snapshots: List[Any]) -> Any:
+    """Combine per-worker metrics: counts add up, equal values are kept, anything else is None"""
+    if not snapshots:
+        return None
+    first = snapshots[0]
+    if isinstance(first, dict) and all(isinstance(snapshot, dict) for snapshot in snapshots):
+        keys = dict.fromkeys(key for snapshot in snapshots for key in snapshot)
+        return {key: _merge_metrics([snapshot[key] for snapshot in snapshots if key in snapshot]) for key in keys}
+    if all(isinstance(snapshot, int) and not isinstance(snapshot, bool) for snapshot in snapshots):
+        return sum(snapshots)
+    # Rates and averages cannot be combined from the snapshots alone
+    return first if all(snapshot == first for snapshot in snapshots) else None
+
+class PreforkInferenceExecutor(InferenceExecutor):
+    """Inference executor whose workers are processes forked after the models are loaded once"""
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue_size: Optional[int] = None):
+        """
+        Load the models in this process, share their tensors and fork the workers.
+
+        Calls to ContentModerator methods are routed to the worker processes; any other
+        blocking call still runs on the thread pool. When the parent switches model version
+        (reload_weights), the workers are replaced by fresh forks that carry the new weights;
+        the forking happens on a background thread while the old workers keep serving.
+
+        Args:
+            max_workers: Number of worker processes, defaults to half the available CPUs
+            max_queue_size: Number of calls allowed to wait for a free worker
+        """
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("The prefork inference mode requires the fork start method")
+
+        super().__init__(max_workers, max_queue_size)
+
+        from model_utils import get_content_moderator
+        self.moderator = get_content_moderator()
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+        self._fork_lock = threading.Lock()
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self.worker_version: Optional[str] = None
+        self.worker_pids = []
+        # Latest metrics reported by each worker process, returned alongside its results
+        self._worker_metrics: Dict[int, Dict[str, Any]] = {}
+        self._fork_workers()
+
+    def _fork_workers(self):
+        """Fork a pool from the moderator's current version and retire the previous pool"""
+        import torch
+        from weights_io import is_memory_mapped
+
+        version = self.moderator.model_version
+
+        # Weights are never written, so every worker reads the same pages. Memory-mapped
+        # safetensors are already shared through the page cache; copying them into shared
+        # memory would only duplicate them.
+        model = self.moderator.model
+        for module in (model.toxic_classifier, model.exit_heads, model.category_head, self.moderator.sentiment_model):
+            if module is None:
+                continue
+            module.requires_grad_(False)
+            for tensor in itertools.chain(module.parameters(), module.buffers()):
+                if not is_memory_mapped(tensor):
+                    tensor.share_memory_()
+
+        # Keep the garbage collector from touching (and so copying) objects inherited from the parent
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+
+        processes = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('fork'),
+            initializer=_init_prefork_worker,
+            initargs=(torch.get_num_threads(),)
+        )
+        # Fork every worker now rather than lazily on first use
+        worker_pids = sorted(set(processes.map(_worker_pid, range(self.max_workers))))
+
+        previous, self._processes = self._processes, processes
+        self.worker_version, self.worker_pids = version, worker_pids
+        if previous is not None:
+            # Calls already running on the old workers finish on the old version
+            previous.shutdown(wait=False)
+        logger.info(f"Forked {len(worker_pids)} inference worker processes for model version {version}")
+
+    def refresh_workers(self):
+        """Re-fork the workers if the parent has switched model version since (blocking)"""
+        with self._fork_lock:
+            if self.moderator.model_version != self.worker_version:
+                self._fork_workers()
+
+    def _current_processes(self) -> ProcessPoolExecutor:
+        """The worker pool; after a version switch it serves the old version until the new pool is forked"""
+        if self.moderator.model_version != self.worker_version and not self._fork_lock.locked():
+            # Never fork on the event loop, which would stall every request for the duration
+            threading.Thread(target=self.refresh_workers, name="prefork-refresh", daemon=True).start()
+        return self._processes
+
+    def _dispatch(self, fn: Callable, args: tuple, kwargs: dict) -> "asyncio.Future":
+        if getattr(fn, '__self__', None) is self.moderator:
+            processes = self._current_processes()
+            return self._unpack(processes.submit(_call_moderator, fn.__name__, args, kwargs))
+        return super()._dispatch(fn, args, kwargs)
+
+    async def _unpack(self, future) -> Any:
+        """Record the metrics a worker sent back with its result"""
+        result, pid, metrics = await asyncio.wrap_future(future)
+        with self._lock:
+            self._worker_metrics[pid] = metrics
+        return result
+
+    def get_moderator_metrics(self, moderator) -> Dict[str, Any]:
+        """
+        Moderation counters summed over the current worker processes, plus each worker's own.
+
+        The parent's moderator does no inference in this mode, so its counters are not used.
+        """
+        with self._lock:
+            workers = {pid: self._worker_metrics[pid] for pid in self.worker_pids if pid in self._worker_metrics}
+        return {
+            **(_merge_metrics(list(workers.values())) or {}),
+            "per_worker": workers
+        }
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get executor load metrics"""
+        return {
+            **super().get_metrics(),
+            "mode": "prefork",
+            "worker_pids": self.worker_pids,
+            "worker_model_version": self.worker_version
+        }
+
+    def shutdown(self):
+        """Stop accepting work and wait for running calls and worker processes to finish"""
+        super().shutdown()
+        self._processes.shutdown(wait=True)
+
+_inference_executor: Optional[InferenceExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_inference_executor() -> InferenceExecutor:
+    """Get the process-wide inference executor"""
+    global _inference_executor
+    with _executor_lock:
+        if _inference_executor is None:
+            if settings.INFERENCE_MODE == "prefork":
+                _inference_executor = PreforkInferenceExecutor()
+            else:
+                _inference_executor = InferenceExecutor()
+        return _inference_executor
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from inference_executor import InferenceExecutor, QueueFullError, get_inference_executor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    """Merge concurrent inference requests into batched model calls"""
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        max_queue_size: int = 256,
+        executor: Optional[InferenceExecutor] = None
+    ):
+        """
+        Create a micro-batching scheduler.
+
+        Args:
+            batch_fn: Blocking function mapping a list of inputs to a list of results
+            max_batch_size: Maximum number of requests merged into one call
+            max_wait_ms: Maximum time the first request of a batch waits for others
+            max_queue_size: Maximum number of queued requests before new ones are rejected
+            executor: Executor that runs the batched calls, defaults to the shared one
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        # Resolved in start(), so creating a batcher (e.g. at import) does not load models or fork workers
+        self.executor = executor
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight = set()
+        self._batches = 0
+        self._batched_items = 0
+        self._rejected = 0
+
+    async def start(self):
+        """Start the background batching loop"""
+        if self._worker is None or self._worker.done():
+            if self.executor is None:
+                self.executor = get_inference_executor()
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.executor.max_workers)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop and fail any requests still queued"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Inference queue stopped"))
+
+    async def submit(self, item: Any) -> Any:
+        """Queue a single input and wait for its result"""
+        await self.start()
+        if self._queue.qsize() >= self.max_queue_size:
+            self._rejected += 1
+            raise QueueFullError("Inference queue is full")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _run(self):
+        """Collect requests until the batch is full or the deadline passes"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Keep at most one batch per executor worker in flight
+            await self._slots.acquire()
+            task = asyncio.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._on_dispatch_done)
+
+    def _on_dispatch_done(self, task: asyncio.Task):
+        """Free the slot held by a finished batch"""
+        self._in_flight.discard(task)
+        self._slots.release()
+
+    async def _dispatch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """Run one batched model call and resolve each caller's future"""
+        # Drop requests whose callers have already gone away
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+
+        items = [item for item, _ in batch]
+        self._batches += 1
+        self._batched_items += len(items)
+        try:
+            results = await self.executor.run(self.batch_fn, items)
+        except Exception as e:
+            logger.error(f"Error in batched inference: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get queue depth and batching metrics"""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_size": self.max_queue_size,
+            "batches": self._batches,
+            "average_batch_size": self._batched_items / self._batches if self._batches else 0.0,
+            "rejected": self._rejected
+        }
@@ -0,0 +1,74 @@
+import logging
+import os
+import pickle
+from typing import List, Sequence
+
+import numpy as np
+from scipy.sparse import hstack
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class LexicalClassifier:
+    """Hashed word and character n-gram logistic regression used as a cheap first-stage filter"""
+
+    def __init__(self, n_features: int = 2 ** 20, alpha: float = 1e-6):
+        # Hashing keeps the model stateless, so it can be trained chunk by chunk
+        self.word_vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            lowercase=True
+        )
+        self.char_vectorizer = HashingVectorizer(
+            n_features=n_features,
+            analyzer='char_wb',
+            ngram_range=(3, 5),
+            alternate_sign=False,
+            lowercase=True
+        )
+        self.classifier = SGDClassifier(loss='log_loss', alpha=alpha)
+
+    def _features(self, texts: Sequence[str]):
+        return hstack([self.word_vectorizer.transform(texts), self.char_vectorizer.transform(texts)]).tocsr()
+
+    def partial_fit(self, texts: Sequence[str], labels: Sequence[int]):
+        """Update the model with one chunk of labelled texts"""
+        self.classifier.partial_fit(self._features(texts), np.asarray(labels), classes=np.array([0, 1]))
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Probability that each text is toxic"""
+        return self.classifier.predict_proba(self._features(texts))[:, 1]
+
+    def save(self, path: str):
+        """Write the model atomically"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved lexical model to {path}")
+
+    @staticmethod
+    def load(path: str) -> "LexicalClassifier":
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+def cascade_coverage(probabilities: np.ndarray, labels: List[int], approve_below: float, reject_above: float) -> dict:
+    """Share of texts each stage would decide and the accuracy of the lexical decisions"""
+    probabilities = np.asarray(probabilities)
+    labels = np.asarray(labels)
+    approved = probabilities <= approve_below
+    rejected = probabilities >= reject_above
+    decided = approved | rejected
+    correct = (approved & (labels == 0)) | (rejected & (labels == 1))
+
+    return {
+        "lexical_approve_share": float(approved.mean()) if len(labels) else 0.0,
+        "lexical_reject_share": float(rejected.mean()) if len(labels) else 0.0,
+        "transformer_share": float((~decided).mean()) if len(labels) else 0.0,
+        "lexical_accuracy": float(correct[decided].mean()) if decided.any() else None
+    }
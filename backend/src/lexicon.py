@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class AhoCorasick:
+    """Compiled multi-pattern matcher that finds every pattern in one pass over the text"""
+
+    def __init__(self, patterns: List[Tuple[str, Any]]):
+        """
+        Build the automaton.
+
+        Args:
+            patterns: (pattern, payload) pairs; the payload is returned with each match
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, Any]]] = [[]]
+
+        for pattern, payload in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append((len(pattern), payload))
+
+        # Breadth-first failure links; each state inherits the outputs of its failure state
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """Yield (start, end, payload) for every pattern occurrence"""
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, payload in self._output[state]:
+                yield index + 1 - length, index + 1, payload
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+class Lexicon:
+    """Hot-reloadable blocklist/allowlist precheck with per-rule hit counters"""
+
+    def __init__(self, path: str, normalize: Callable[[str], str], reload_interval: float = 5.0):
+        """
+        Load the lexicon file.
+
+        The file is JSON with "blocklist" and "allowlist" arrays of rules, each
+        {"id": ..., "patterns": [...]}. Blocklist patterns match whole words anywhere
+        in the text; allowlist patterns must equal the entire normalized text.
+
+        Args:
+            path: Lexicon JSON file
+            normalize: Text normalization applied to both patterns and inputs
+            reload_interval: Minimum seconds between checks of the file for changes
+        """
+        self.path = path
+        self.normalize = normalize
+        self.reload_interval = reload_interval
+
+        self._lock = threading.Lock()
+        self._matcher: Optional[AhoCorasick] = None
+        self._allowlist: Dict[str, str] = {}
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._hits: Dict[str, int] = {}
+        self._stats = {"checks": 0, "reloads": 0, "reload_errors": 0}
+
+        self.reload()
+
+    def reload(self) -> bool:
+        """Recompile the lexicon from disk; the previous version stays active if the file is invalid"""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            block_patterns = [
+                (self.normalize(pattern), rule['id'])
+                for rule in data.get('blocklist', [])
+                for pattern in rule.get('patterns', [])
+            ]
+            allowlist = {
+                self.normalize(pattern): rule['id']
+                for rule in data.get('allowlist', [])
+                for pattern in rule.get('patterns', [])
+            }
+            matcher = AhoCorasick([(pattern, rule_id) for pattern, rule_id in block_patterns if pattern])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            with self._lock:
+                self._stats["reload_errors"] += 1
+            logger.error(f"Failed to load lexicon from {self.path}: {str(e)}")
+            return False
+
+        with self._lock:
+            self._matcher = matcher
+            self._allowlist = allowlist
+            self._mtime = mtime
+            self._stats["reloads"] += 1
+        logger.info(f"Loaded lexicon with {len(block_patterns)} blocklist and {len(allowlist)} allowlist patterns")
+        return True
+
+    def _maybe_reload(self):
+        """Pick up edits to the lexicon file without a restart"""
+        now = time.monotonic()
+        if now - self._last_check < self.reload_interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    def check(self, text: str) -> Optional[Tuple[str, str]]:
+        """
+        Match a text against the lexicon.
+
+        Returns:
+            (decision, rule_id) when the text is settled deterministically, otherwise None
+        """
+        self._maybe_reload()
+        normalized = self.normalize(text)
+
+        with self._lock:
+            self._stats["checks"] += 1
+            matcher, allowlist = self._matcher, self._allowlist
+
+        rule_id, decision = None, None
+        # preprocess_text strips emoji and symbols, so emoji-only input normalizes to nothing
+        if not normalized.strip():
+            rule_id, decision = "empty", "approve"
+        elif matcher is not None:
+            for start, end, payload in matcher.iter_matches(normalized):
+                before = normalized[start - 1] if start > 0 else ' '
+                after = normalized[end] if end < len(normalized) else ' '
+                if not _is_word_char(before) and not _is_word_char(after):
+                    rule_id, decision = payload, "reject"
+                    break
+        if rule_id is None and normalized in allowlist:
+            rule_id, decision = allowlist[normalized], "approve"
+
+        if rule_id is None:
+            return None
+        with self._lock:
+            self._hits[rule_id] = self._hits.get(rule_id, 0) + 1
+        return decision, rule_id
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get per-rule hit counters and reload status"""
+        with self._lock:
+            return {
+                **self._stats,
+                "path": self.path,
+                "rule_hits": dict(self._hits),
+                "hits": sum(self._hits.values())
+            }
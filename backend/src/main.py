@@ -1,16 +1,24 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, File, UploadFile, Header
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, File, UploadFile, Header, Request
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import APIKeyHeader
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 import logging
+import os
+import shutil
 from datetime import datetime
 import json
 
 from config import settings
 from database import get_db, get_mongo_collection
-from model_utils import ContentModerator
-from cloud_storage import CloudStorage
+from model_utils import get_content_moderator
+from cloud_storage import get_cloud_storage
+from inference_queue import MicroBatcher
+from inference_executor import QueueFullError, get_inference_executor
+from model_sync import get_model_sync
+from startup import startup_profile
 from models import User, AnalysisRequest, ModelTraining, ModelVersion
 from tasks import analyze_text_batch, train_model_async, sync_model_weights
 
@@ -35,13 +43,19 @@ app.add_middleware(
 )
 
 # Initialize services
-content_moderator = ContentModerator()
-cloud_storage = CloudStorage()
+# Models load during startup, not at import
+content_moderator = get_content_moderator(load=False)
+analysis_batcher = MicroBatcher(
+    content_moderator.batch_get_detailed_analysis,
+    max_batch_size=settings.MICRO_BATCH_MAX_SIZE,
+    max_wait_ms=settings.MICRO_BATCH_MAX_WAIT_MS,
+    max_queue_size=settings.MICRO_BATCH_MAX_QUEUE
+)
 
 # API Key security
 api_key_header = APIKeyHeader(name=settings.API_KEY_HEADER)
 
-async def verify_api_key(api_key: str = Depends(api_key_header), db: Session = Depends(get_db)):
+def verify_api_key(api_key: str = Depends(api_key_header), db: Session = Depends(get_db)):
     user = db.query(User).filter(User.api_key == api_key).first()
     if not user or not user.is_active:
         raise HTTPException(status_code=401, detail="Invalid API key")
@@ -52,10 +66,22 @@ async def root():
     """Root endpoint returning API status and model information."""
     return {
         "status": "online",
-        "model_version": settings.MODEL_VERSION,
+        "model_version": content_moderator.model_version,
         "api_version": "1.0.0"
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Inference executor and queue metrics."""
+    return {
+        "executor": get_inference_executor().get_metrics(),
+        "analysis_queue": analysis_batcher.get_metrics(),
+        # Counters of the processes doing the inference (the worker processes in prefork mode)
+        **get_inference_executor().get_moderator_metrics(content_moderator),
+        "inference_backend": content_moderator.get_backend_info(),
+        "startup": startup_profile.get_report()
+    }
+
 @app.post("/analyze")
 async def analyze_text(
     text: str,
@@ -72,10 +98,11 @@ async def analyze_text(
             status="pending"
         )
         db.add(request)
-        db.commit()
+        await run_in_threadpool(db.commit)
+        await run_in_threadpool(db.refresh, request)
         
-        # Analyze text
-        result = content_moderator.get_detailed_analysis(text)
+        # Analyze text together with concurrent requests
+        result = await analysis_batcher.submit(text)
         
         # Store result in MongoDB
         analysis_collection = get_mongo_collection("analysis_results")
@@ -86,13 +113,13 @@ async def analyze_text(
             "result": result,
             "created_at": datetime.utcnow()
         }
-        analysis_collection.insert_one(result_doc)
+        await run_in_threadpool(analysis_collection.insert_one, result_doc)
         
         # Update request status
         request.status = "completed"
         request.processed_at = datetime.utcnow()
         request.result_id = str(result_doc["_id"])
-        db.commit()
+        await run_in_threadpool(db.commit)
         
         return {
             "request_id": request.id,
@@ -100,14 +127,63 @@ async def analyze_text(
             "result": result
         }
         
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Inference queue is full, retry later")
     except Exception as e:
         logger.error(f"Error analyzing text: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/analyze/stream")
+async def analyze_text_stream(
+    request: Request,
+    text: str,
+    format: str = "ndjson",
+    user: User = Depends(verify_api_key)
+):
+    """Stream a detailed analysis: the overall verdict first, then sentence results as they finish."""
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+
+    executor = get_inference_executor()
+    events = content_moderator.iter_detailed_analysis(text)
+
+    def encode(event: Dict[str, Any]) -> str:
+        payload = json.dumps(event, default=str)
+        return f"event: {event['event']}\ndata: {payload}\n\n" if format == "sse" else f"{payload}\n"
+
+    # Compute the verdict before committing to a streaming response, so overload is still a 503
+    try:
+        first = await executor.run(next, events, None)
+    except QueueFullError:
+        events.close()
+        raise HTTPException(status_code=503, detail="Inference queue is full, retry later")
+
+    async def stream():
+        try:
+            event = first
+            while event is not None:
+                yield encode(event)
+                if await request.is_disconnected():
+                    logger.info("Client disconnected, stopping streamed analysis")
+                    break
+                event = await executor.run(next, events, None)
+        except QueueFullError:
+            yield encode({"event": "error", "detail": "Inference queue is full, retry later"})
+        finally:
+            try:
+                events.close()
+            except ValueError:
+                # A step is still running; the generator is released once it finishes
+                pass
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream" if format == "sse" else "application/x-ndjson"
+    )
+
 @app.post("/batch-analyze")
 async def batch_analyze(
     texts: List[str],
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     user: User = Depends(verify_api_key)
 ):
@@ -116,12 +192,11 @@ async def batch_analyze(
         # Create batch analysis task
         task_id = f"batch_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{user.id}"
         
-        # Start background task
-        background_tasks.add_task(
-            analyze_text_batch,
+        # Run on a Celery worker, which holds its own preloaded models, rather than on this
+        # process's threadpool where it would bypass the inference executor's bounds
+        analyze_text_batch.delay(
             texts=texts,
-            user_id=user.id,
-            task_id=task_id
+            batch_id=task_id
         )
         
         return {
@@ -136,7 +211,6 @@ async def batch_analyze(
 
 @app.post("/train")
 async def train_model(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     params: Dict[str, Any] = None,
     db: Session = Depends(get_db),
@@ -145,8 +219,9 @@ async def train_model(
     """Start model training with custom data."""
     try:
         # Validate file
-        if not file.filename.endswith('.csv'):
-            raise HTTPException(status_code=400, detail="Only CSV files are supported")
+        extension = os.path.splitext(file.filename)[1].lower()
+        if extension not in ('.csv', '.parquet', '.jsonl'):
+            raise HTTPException(status_code=400, detail="Only CSV, Parquet and JSON Lines files are supported")
         
         # Create training record
         training = ModelTraining(
@@ -156,25 +231,32 @@ async def train_model(
             parameters=params or {}
         )
         db.add(training)
-        db.commit()
+        await run_in_threadpool(db.commit)
+        await run_in_threadpool(db.refresh, training)
         
-        # Upload training data to cloud storage
-        data_path = f"training_data/{training.id}.csv"
-        cloud_storage.upload_training_data(
-            file.file,
-            {
-                "training_id": training.id,
-                "user_id": user.id,
-                "parameters": params
-            }
-        )
+        # Upload training data to cloud storage, keeping its format in the object name
+        local_path = f"training_data/{training.id}{extension}"
+        await run_in_threadpool(os.makedirs, "training_data", exist_ok=True)
+        with open(local_path, "wb") as f:
+            await run_in_threadpool(shutil.copyfileobj, file.file, f)
+        try:
+            blob_path = await run_in_threadpool(
+                get_cloud_storage().upload_training_data,
+                local_path,
+                {
+                    "training_id": training.id,
+                    "user_id": user.id,
+                    "parameters": params
+                }
+            )
+        finally:
+            os.remove(local_path)
         
-        # Start background training task
-        background_tasks.add_task(
-            train_model_async,
-            training_id=training.id,
-            data_path=data_path,
-            params=params
+        # Train on a Celery worker, which downloads the data from cloud storage
+        train_model_async.delay(
+            file_path=blob_path,
+            config=params or {},
+            training_id=str(training.id)
         )
         
         return {
@@ -188,7 +270,7 @@ async def train_model(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/model-info")
-async def get_model_info(db: Session = Depends(get_db)):
+def get_model_info(db: Session = Depends(get_db)):
     """Get information about the current model."""
     try:
         # Get current model version
@@ -227,17 +309,14 @@ async def get_model_info(db: Session = Depends(get_db)):
 
 @app.post("/sync-model")
 async def sync_model(
-    background_tasks: BackgroundTasks,
     version: str,
     user: User = Depends(verify_api_key)
 ):
     """Sync model weights from cloud storage."""
     try:
-        # Start background sync task
-        background_tasks.add_task(
-            sync_model_weights,
-            version=version
-        )
+        # A Celery worker downloads and swaps in the weights, then publishes the version so every
+        # serving process (see model_sync) reloads them too
+        sync_model_weights.delay(version=version)
         
         return {
             "status": "accepted",
@@ -255,13 +334,18 @@ async def startup_event():
     try:
         # Initialize content moderator
         await content_moderator.initialize()
+        # Create the executor now; in prefork mode this forks the workers before the queues start
+        get_inference_executor()
+        await analysis_batcher.start()
+        await get_model_sync().start()
         
         # Check database connections
         from database import check_db_connection
-        if not check_db_connection():
+        if not await run_in_threadpool(check_db_connection):
             logger.error("Database connection failed")
             raise Exception("Database connection failed")
         
+        startup_profile.log_report()
         logger.info("Application started successfully")
         
     except Exception as e:
@@ -274,7 +358,10 @@ async def shutdown_event():
     """Cleanup on shutdown."""
     try:
         # Cleanup resources
+        await analysis_batcher.stop()
+        await get_model_sync().stop()
         await content_moderator.cleanup()
+        get_inference_executor().shutdown()
         logger.info("Application shutdown successfully")
         
     except Exception as e:
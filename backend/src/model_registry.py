@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+import torch
+from transformers import (
+    DistilBertConfig,
+    DistilBertTokenizerFast,
+    DistilBertForSequenceClassification,
+    DistilBertModel
+)
+
+from config import settings
+from heads import CategoryHead, EarlyExitHeads
+from lexical_model import LexicalClassifier
+from weights_io import find_weights, load_weights
+from startup import startup_profile
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BASE_MODEL_NAME = 'distilbert-base-uncased'
+SENTIMENT_MODEL_NAME = 'distilbert-base-uncased-finetuned-sst-2-english'
+WEIGHTS_DIR = os.path.join(os.path.dirname(__file__), 'weights')
+
+class ModelRegistry:
+    """Load each model artifact once per process and share it between consumers"""
+
+    def __init__(self):
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self._artifacts: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def _get(self, key: str, loader: Callable[[], Any]) -> Any:
+        """Return a cached artifact, loading it on first use"""
+        with self._lock:
+            if key not in self._artifacts:
+                logger.info(f"Loading model artifact: {key}")
+                with startup_profile.measure(f"model:{key}"):
+                    self._artifacts[key] = loader()
+            return self._artifacts[key]
+
+    def invalidate(self, key: str):
+        """Forget a cached artifact so the next request reloads it"""
+        with self._lock:
+            self._artifacts.pop(key, None)
+
+    def replace(self, key: str, artifact: Any):
+        """Publish a newly loaded artifact in place of the cached one"""
+        with self._lock:
+            self._artifacts[key] = artifact
+
+    def get_tokenizer(self) -> DistilBertTokenizerFast:
+        """Tokenizer shared by every head (the SST-2 checkpoint uses the same vocabulary)"""
+        return self._get('tokenizer', lambda: DistilBertTokenizerFast.from_pretrained(BASE_MODEL_NAME))
+
+    def get_toxicity_model(self) -> DistilBertForSequenceClassification:
+        """Toxicity classifier whose encoder is the shared backbone"""
+        return self._get('toxicity', self.load_toxicity_model)
+
+    def load_toxicity_model(self, weights_path: Optional[str] = None) -> DistilBertForSequenceClassification:
+        """Build a fresh, uncached toxicity classifier, optionally with fine-tuned weights"""
+        if weights_path is None:
+            return DistilBertForSequenceClassification.from_pretrained(
+                BASE_MODEL_NAME,
+                num_labels=2
+            ).to(self.device).eval()
+
+        # Fine-tuned weights replace every parameter, so skip loading the base checkpoint and
+        # let parameters alias the memory-mapped file instead of copying it
+        model = DistilBertForSequenceClassification(DistilBertConfig.from_pretrained(BASE_MODEL_NAME, num_labels=2))
+        state_dict, _ = load_weights(weights_path)
+        model.load_state_dict(state_dict, assign=True)
+        return model.to(self.device).eval()
+
+    def get_encoder(self) -> DistilBertModel:
+        """Shared DistilBERT encoder used for toxicity and embeddings"""
+        return self.get_toxicity_model().distilbert
+
+    def get_category_head(self) -> Optional[CategoryHead]:
+        """Multi-label category head trained by ModelTrainer.train_category_head, if available"""
+        return self._get('category_head', self._load_category_head)
+
+    def _load_category_head(self) -> Optional[CategoryHead]:
+        """Load the trained category head when it covers the configured categories"""
+        path = find_weights(WEIGHTS_DIR, 'category_head')
+        if path is None:
+            logger.warning("No trained category head weights found; category scores are disabled")
+            return None
+
+        state_dict, metadata = load_weights(path, self.device)
+        if metadata['categories'] != list(settings.MODERATION_CATEGORIES):
+            logger.warning(
+                f"Category head weights cover {metadata['categories']}, "
+                f"configured categories are {settings.MODERATION_CATEGORIES}; category scores are disabled"
+            )
+            return None
+
+        head = CategoryHead(self.get_encoder().config.dim, metadata['categories'])
+        head.load_state_dict(state_dict)
+        # Digest of the classifier whose encoder the head was trained on (see state_dict_digest)
+        head.classifier_digest = metadata.get('classifier_digest')
+        logger.info("Loaded trained weights for category head")
+        return head.to(self.device).eval()
+
+    def get_exit_heads(self) -> Optional[EarlyExitHeads]:
+        """Intermediate-layer exit classifiers trained by ModelTrainer, if available"""
+        return self._get('exit_heads', self._load_exit_heads)
+
+    def _load_exit_heads(self) -> Optional[EarlyExitHeads]:
+        path = find_weights(WEIGHTS_DIR, 'exit_heads')
+        if path is None:
+            return None
+
+        config = self.get_encoder().config
+        state_dict, metadata = load_weights(path, self.device)
+        heads = EarlyExitHeads(config.dim, config.n_layers, head_size=metadata['head_size'])
+        heads.load_state_dict(state_dict)
+        # Digest of the classifier the heads were fitted on (see state_dict_digest)
+        heads.classifier_digest = metadata.get('classifier_digest')
+        logger.info("Loaded early-exit heads")
+        return heads.to(self.device).eval()
+
+    def get_lexical_model(self) -> Optional[LexicalClassifier]:
+        """Hashed n-gram first-stage classifier trained by train.train_lexical_model, if available"""
+        return self._get('lexical', self._load_lexical_model)
+
+    def _load_lexical_model(self) -> Optional[LexicalClassifier]:
+        path = settings.LEXICAL_MODEL_PATH or os.path.join(WEIGHTS_DIR, 'lexical_model.pkl')
+        if not os.path.exists(path):
+            return None
+        logger.info(f"Loaded lexical model from {path}")
+        return LexicalClassifier.load(path)
+
+    def get_sentiment_model(self) -> DistilBertForSequenceClassification:
+        """SST-2 sentiment classifier, a separately fine-tuned artifact"""
+        return self._get('sentiment', lambda: DistilBertForSequenceClassification.from_pretrained(
+            SENTIMENT_MODEL_NAME
+        ).to(self.device).eval())
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_model_registry() -> ModelRegistry:
+    """Get the process-wide model registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Optional
+
+import redis
+
+from config import settings
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MODEL_VERSION_KEY = "model_sync:version"
+
+class ModelSync:
+    """
+    Propagate a model swap to every serving process.
+
+    sync_model_weights reloads the weights in one Celery worker and publishes the new version
+    in Redis. Every other process holding a ContentModerator (uvicorn workers, other Celery
+    workers) notices the change, either by polling in the background or when sync() is called,
+    and reloads the same weights file itself.
+    """
+
+    def __init__(
+        self,
+        weights_path: str,
+        redis_url: Optional[str] = None,
+        poll_interval_seconds: float = 5.0,
+        executor: Optional[Any] = None
+    ):
+        """
+        Args:
+            weights_path: Weights file reloaded when a new version is published
+            redis_url: Redis connection URL, or None to disable syncing
+            poll_interval_seconds: Time between checks of the published version
+            executor: Inference executor whose worker processes follow reloads; resolved in start()
+        """
+        self.weights_path = weights_path
+        self.poll_interval = poll_interval_seconds
+        self.executor = executor
+        self.redis_client = redis.Redis.from_url(redis_url) if redis_url else None
+
+        self._seen: Optional[str] = None
+        self._lock = threading.Lock()
+        self._worker: Optional[asyncio.Task] = None
+
+    def publish(self, version: str):
+        """Announce the version now in weights_path to every serving process"""
+        if self.redis_client is None:
+            return
+        with self._lock:
+            self._seen = version
+        try:
+            self.redis_client.set(MODEL_VERSION_KEY, version)
+            logger.info(f"Published model version {version}")
+        except redis.RedisError as e:
+            logger.warning(f"Could not publish model version {version}: {str(e)}")
+
+    def published_version(self) -> Optional[str]:
+        """Version most recently published, if any"""
+        if self.redis_client is None:
+            return None
+        try:
+            value = self.redis_client.get(MODEL_VERSION_KEY)
+        except redis.RedisError as e:
+            logger.warning(f"Could not read the published model version: {str(e)}")
+            return None
+        return value.decode('utf-8') if value is not None else None
+
+    def sync(self) -> bool:
+        """
+        Reload the weights if a version was published since the last check (blocking).
+
+        Returns:
+            True if this process reloaded its weights
+        """
+        version = self.published_version()
+        with self._lock:
+            if version is None or version == self._seen:
+                return False
+            self._seen = version
+
+            from model_utils import get_content_moderator
+            moderator = get_content_moderator()
+            if version == moderator.model_version:
+                return False
+            logger.info(f"Model version {version} was published, reloading {self.weights_path}")
+            moderator.reload_weights(self.weights_path)
+
+        # Worker processes forked from this one carry the old weights until they are replaced
+        if self.executor is not None and hasattr(self.executor, 'refresh_workers'):
+            self.executor.refresh_workers()
+        return True
+
+    async def start(self):
+        """Start polling for published versions"""
+        if self.redis_client is None:
+            return
+        if self._worker is None or self._worker.done():
+            if self.executor is None:
+                from inference_executor import get_inference_executor
+                self.executor = get_inference_executor()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop polling"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def _run(self):
+        """Check for a new version periodically, reloading off the event loop"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await loop.run_in_executor(None, self.sync)
+            except Exception as e:
+                logger.error(f"Error syncing model weights: {str(e)}")
+
+_model_sync: Optional[ModelSync] = None
+_model_sync_lock = threading.Lock()
+
+def get_model_sync() -> ModelSync:
+    """Get the process-wide model sync"""
+    global _model_sync
+    with _model_sync_lock:
+        if _model_sync is None:
+            from model_utils import CUSTOM_WEIGHTS_PATH
+            _model_sync = ModelSync(
+                CUSTOM_WEIGHTS_PATH,
+                redis_url=settings.MODEL_SYNC_REDIS_URL or None,
+                poll_interval_seconds=settings.MODEL_SYNC_POLL_SECONDS
+            )
+        return _model_sync
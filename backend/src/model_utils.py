@@ -1,144 +1,794 @@
-from typing import List, Dict, Union, Optional, Any
+from typing import List, Dict, Union, Optional, Any, Set, Tuple, Iterator
 import torch
-from transformers import (
-    DistilBertTokenizer,
-    DistilBertForSequenceClassification,
-    DistilBertModel,
-    pipeline
-)
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 import nltk
-from nltk.tokenize import sent_tokenize
 import logging
 import os
 import datetime
 import re
+import threading
+import hashlib
+import asyncio
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
 
-# Download required NLTK data
-nltk.download('punkt')
+from config import settings
+from model_registry import WEIGHTS_DIR, get_model_registry
+from heads import mean_pool, sequence_classification_logits
+from result_cache import ResultCache
+from embedding_index import EmbeddingIndex
+from inference_backends import TorchBackend, create_backend, check_parity
+from lexicon import Lexicon
+from token_cache import TokenCache, Encoding
+from serving_model import ServingModel
+from weights_io import find_weights, state_dict_digest
+from startup import ensure_punkt, startup_profile
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _length_buckets(lengths: List[int], batch_size: int) -> List[List[int]]:
+    """Group indices of similar token length into batches of at most batch_size"""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+# Sample inputs used to verify optimized backends against the eager model
+PARITY_TEXTS = [
+    "Thanks for sharing, this was really helpful!",
+    "You are an idiot and everyone hates you.",
+    "The meeting has been moved to 3pm on Thursday.",
+    "Get lost, nobody wants your stupid opinions here.",
+    "I disagree with the article, but it raises fair points."
+]
+
+CUSTOM_WEIGHTS_PATH = os.path.join(WEIGHTS_DIR, 'toxic_classifier.safetensors')
+
+def _file_digest(path: str) -> str:
+    """SHA-256 of a file, used to version model weights"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
 class ContentModerator:
     def __init__(self):
-        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        self.tokenizer = DistilBertTokenizer.from_pretrained('distilbert-base-uncased')
+        # Models load on first use or in initialize(), so importing a service module stays cheap
+        self._loaded = False
+        self._load_lock = threading.Lock()
         
-        # Load models for different tasks
-        self.toxic_classifier = DistilBertForSequenceClassification.from_pretrained(
-            'distilbert-base-uncased',
-            num_labels=2
-        ).to(self.device)
+        # The toxicity classifier, its encoder (also used for embeddings), backend and exit heads
+        # form one versioned bundle; requests pin a bundle and weight syncs swap it atomically
+        self._local = threading.local()
+        self._swap_lock = threading.Lock()
+
+        # Guards the metrics counters, which many inference threads update at once
+        self._stats_lock = threading.Lock()
+
+    def load(self):
+        """Load models and caches once; safe to call from several threads"""
+        with self._load_lock:
+            if self._loaded:
+                return
+            with startup_profile.measure("content_moderator"):
+                self._load()
+            self._loaded = True
+
+    async def initialize(self):
+        """Load the moderator off the event loop during application startup"""
+        await asyncio.get_running_loop().run_in_executor(None, self.load)
+
+    async def cleanup(self):
+        """Persist state worth keeping across restarts"""
+        if self._loaded:
+            self.save_semantic_index()
+
+    def _load(self):
+        ensure_punkt()
+        registry = get_model_registry()
+        self.device = registry.device
+        self.tokenizer = registry.get_tokenizer()
         
-        # Load base model for embeddings
-        self.base_model = DistilBertModel.from_pretrained('distilbert-base-uncased').to(self.device)
+        # Sentiment classifier reuses the shared tokenizer
+        self.sentiment_model = registry.get_sentiment_model()
         
-        # Initialize sentiment analysis pipeline
-        self.sentiment_analyzer = pipeline(
-            "sentiment-analysis",
-            model="distilbert-base-uncased-finetuned-sst-2-english",
-            device=0 if torch.cuda.is_available() else -1
-        )
+        with startup_profile.measure("toxicity_model_version"):
+            self._active = self._load_version(find_weights(WEIGHTS_DIR, 'toxic_classifier'))
+        
+        # Optional intermediate-layer exits for the toxicity classifier
+        self.early_exit_enabled = settings.EARLY_EXIT_ENABLED
+        self.early_exit_threshold = settings.EARLY_EXIT_THRESHOLD
+        self._exit_counts = [0] * self._active.encoder.config.n_layers
+        
+        # Optional cheap lexical stage that settles confidently easy texts before the transformer
+        self.lexical_model = registry.get_lexical_model()
+        self.cascade_enabled = settings.CASCADE_ENABLED
+        self.cascade_approve_below = settings.CASCADE_APPROVE_BELOW
+        self.cascade_reject_above = settings.CASCADE_REJECT_ABOVE
+        self._stage_counts = {"lexicon": 0, "lexical_approve": 0, "lexical_reject": 0, "semantic_reuse": 0, "transformer": 0}
+        
+        # Deterministic blocklist/allowlist precheck that runs before any model
+        self.lexicon = None
+        if settings.LEXICON_PATH:
+            self.lexicon = Lexicon(settings.LEXICON_PATH, self.preprocess_text, settings.LEXICON_RELOAD_INTERVAL_SECONDS)
+
+        # Token ids and offsets are cached so documents and their sentences are tokenized once
+        self.token_cache = TokenCache(settings.TOKEN_CACHE_MAX_ENTRIES) if settings.TOKEN_CACHE_MAX_ENTRIES > 0 else None
+        self.sentence_splitter = nltk.data.load('tokenizers/punkt/english.pickle')
 
         # Initialize preprocessing parameters
         self.max_length = 512
+        self.batch_size = settings.INFERENCE_BATCH_SIZE
         self.min_confidence = 0.7
-        self.categories = ['vulgar', 'cyberbullying', 'misinformation']
+        self.reject_threshold = 0.7
+        
+        # Long-text windowing parameters
+        self.window_stride = settings.LONG_TEXT_WINDOW_OVERLAP
+        self.max_windows = settings.LONG_TEXT_MAX_WINDOWS
+        self.window_pooling = settings.LONG_TEXT_POOLING
+        self.window_early_stop = settings.LONG_TEXT_EARLY_STOP
+
+        # Results are cached per model version, so new weights never serve stale decisions
+        self.result_cache = ResultCache(
+            max_entries=settings.RESULT_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.RESULT_CACHE_TTL_SECONDS,
+            redis_url=settings.RESULT_CACHE_REDIS_URL or None
+        ) if settings.RESULT_CACHE_ENABLED else None
+        self.semantic_index: Optional[EmbeddingIndex] = None
+        self.semantic_threshold = settings.SEMANTIC_REUSE_THRESHOLD
+        self._semantic_stats = {"lookups": 0, "reused": 0}
+
+        if settings.SEMANTIC_REUSE_ENABLED:
+            with startup_profile.measure("semantic_index"):
+                self.semantic_index = self._load_semantic_index()
+
+    @property
+    def model(self) -> ServingModel:
+        """Model version pinned by the current request, or the active one"""
+        return getattr(self._local, 'model', None) or self._active
+
+    @property
+    def model_version(self) -> str:
+        return self.model.version
+
+    @contextmanager
+    def _pinned_model(self, model: Optional[ServingModel] = None):
+        """Run a request on one model version even if a swap happens midway"""
+        if not self._loaded:
+            self.load()
+
+        pinned = getattr(self._local, 'model', None)
+        if pinned is not None:
+            yield pinned
+            return
+
+        if model is None:
+            model = self._acquire_active()
+        elif not model.acquire():
+            raise RuntimeError(f"Model version {model.version} has been released")
+        self._local.model = model
+        try:
+            yield model
+        finally:
+            self._local.model = None
+            model.release()
+
+    def _acquire_active(self) -> ServingModel:
+        """Acquire the active version; a version retired by a concurrent swap is skipped for its successor"""
+        while True:
+            model = self._active
+            if model.acquire():
+                return model
+
+    def _load_version(self, weights_path: Optional[str]) -> ServingModel:
+        """Build a complete model version from fine-tuned weights (or the base checkpoint) without touching the live one"""
+        registry = get_model_registry()
+        if weights_path is not None and os.path.exists(weights_path):
+            toxic_classifier = registry.load_toxicity_model(weights_path)
+            version = f"{settings.MODEL_VERSION}+{_file_digest(weights_path)[:12]}"
+            logger.info(f"Loaded custom weights for toxic classifier (version {version})")
+        else:
+            toxic_classifier = registry.get_toxicity_model()
+            version = settings.MODEL_VERSION
+
+        # Exit heads are trained against specific encoder weights; heads fitted on another
+        # classifier (e.g. after sync_model_weights fetched only new classifier weights) are dropped
+        registry.replace('toxicity', toxic_classifier)
+        registry.invalidate('exit_heads')
+        exit_heads = registry.get_exit_heads()
+        classifier_digest = state_dict_digest(toxic_classifier.state_dict())
+        if exit_heads is not None and exit_heads.classifier_digest != classifier_digest:
+            logger.warning(f"Early-exit heads were not fitted on model version {version}; early exit disabled for it")
+            exit_heads = None
+
+        # The category head reads the same encoder output, so it is tied to the classifier the same way
+        registry.invalidate('category_head')
+        category_head = registry.get_category_head()
+        if category_head is not None and category_head.classifier_digest != classifier_digest:
+            logger.warning(f"Category head was not trained on model version {version}; category scores disabled for it")
+            category_head = None
+
+        # Optimized backends snapshot the weights, so each version builds its own
+        backend, parity = self._build_backend(toxic_classifier, version)
+        return ServingModel(version, toxic_classifier, backend, exit_heads, parity, category_head)
+
+    def reload_weights(self, weights_path: Optional[str] = None) -> str:
+        """
+        Load new weights in the background and switch to them in one step.
+
+        Requests already running finish on the previous version, whose memory is released
+        once they drain.
+
+        Args:
+            weights_path: Fine-tuned weights; defaults to the toxic_classifier weights in the weights directory
+
+        Returns:
+            The version now being served
+        """
+        self.load()
+        weights_path = weights_path or find_weights(WEIGHTS_DIR, 'toxic_classifier')
+        with self._swap_lock:
+            if weights_path is not None and os.path.exists(weights_path) and self._active.version.endswith(f"+{_file_digest(weights_path)[:12]}"):
+                logger.info(f"Model version {self._active.version} is already active")
+                return self._active.version
+
+            model = self._load_version(weights_path)
+            with self._pinned_model(model):
+                # Warm up allocators and kernels before the version takes traffic
+                self._score_units(PARITY_TEXTS, {'toxicity', 'categories', 'sentiment'})
+
+            previous, self._active = self._active, model
+            if self.result_cache is not None:
+                self.result_cache.invalidate()
+            if self.semantic_index is not None:
+                self.semantic_index.clear()
+            previous.retire()
+
+        logger.info(f"Switched model version {previous.version} -> {model.version}")
+        return model.version
+
+    def _build_backend(self, toxic_classifier, version: str):
+        """Create the configured inference backend, falling back to eager PyTorch if it fails parity"""
+        encoder = toxic_classifier.distilbert
+        reference = TorchBackend(encoder, self.sentiment_model)
+        name = settings.INFERENCE_BACKEND
+        if name == "torch":
+            return reference, None
+
+        try:
+            backend = create_backend(
+                name,
+                encoder,
+                self.sentiment_model,
+                settings.ONNX_EXPORT_DIR,
+                version
+            )
+            # Encode through the serving path: calling the shared fast tokenizer with truncation or
+            # padding here would race (or reconfigure) requests using it during a live reload
+            rows = [self._windows(token_ids)[0] for token_ids, _ in self._tokenize(PARITY_TEXTS)]
+            inputs = self.tokenizer.pad({'input_ids': rows}, return_tensors="pt").to(self.device)
+            parity = check_parity(
+                reference,
+                backend,
+                lambda hidden_states: sequence_classification_logits(toxic_classifier, hidden_states),
+                inputs
+            )
+        except Exception as e:
+            logger.error(f"Error building {name} inference backend, using eager PyTorch: {e}")
+            return reference, None
+
+        logger.info(f"Parity of {name} backend against eager model: {parity}")
+        tolerance = settings.BACKEND_PARITY_TOLERANCE
+        if parity['toxicity_max_abs_diff'] > tolerance or parity['sentiment_max_abs_diff'] > tolerance:
+            logger.error(f"{name} backend exceeds parity tolerance {tolerance}, using eager PyTorch")
+            return reference, None
+
+        return backend, parity
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Counters of the moderation work done in this process, keyed by /metrics section"""
+        return {
+            "result_cache": self.result_cache.get_metrics() if self.result_cache else None,
+            "semantic_reuse": self.get_semantic_metrics(),
+            "early_exit": self.get_early_exit_metrics(),
+            "cascade": self.get_cascade_metrics(),
+            "lexicon": self.get_lexicon_metrics(),
+            "token_cache": self.get_token_cache_metrics(),
+            "model_version": self.get_model_version_info()
+        }
 
-        # Load custom weights if available
-        self._load_custom_weights()
+    def get_backend_info(self) -> Dict[str, Any]:
+        """Get the active inference backend and its parity against the eager model"""
+        model = self._active
+        return {
+            "name": model.backend.name,
+            "parity": model.backend_parity
+        }
+
+    def get_model_version_info(self) -> Dict[str, Any]:
+        """Get the served model version and how many requests are using it"""
+        return self._active.get_info()
 
-    def _load_custom_weights(self):
-        """Load custom fine-tuned weights if available"""
-        custom_weights_path = os.path.join(os.path.dirname(__file__), 'weights', 'toxic_classifier.pt')
-        if os.path.exists(custom_weights_path):
+    def _load_semantic_index(self) -> EmbeddingIndex:
+        """Warm-start the near-duplicate index from disk when it was saved by the same model version"""
+        path = settings.SEMANTIC_INDEX_PATH
+        capacity = settings.SEMANTIC_INDEX_CAPACITY
+        if path and os.path.exists(path):
             try:
-                self.toxic_classifier.load_state_dict(
-                    torch.load(custom_weights_path, map_location=self.device)
-                )
-                logger.info("Loaded custom weights for toxic classifier")
+                index, metadata = EmbeddingIndex.load(path, capacity=capacity)
+                if metadata.get("model_version") == self.model_version:
+                    return index
+                logger.info("Discarding saved embedding index built by a different model version")
             except Exception as e:
-                logger.error(f"Error loading custom weights: {e}")
+                logger.error(f"Error loading embedding index: {e}")
+        return EmbeddingIndex(self.model.encoder.config.dim, capacity=capacity)
+
+    def save_semantic_index(self):
+        """Persist the near-duplicate index so the next process can warm-start from it"""
+        if self.semantic_index is not None and settings.SEMANTIC_INDEX_PATH:
+            self.semantic_index.save(settings.SEMANTIC_INDEX_PATH, {"model_version": self.model_version})
+
+    def _count(self, counters, key, amount: int = 1):
+        """Add to a metrics counter (a dict entry or list slot) from any inference thread"""
+        with self._stats_lock:
+            counters[key] += amount
+
+    def get_semantic_metrics(self) -> Dict[str, Any]:
+        """Get near-duplicate reuse counters"""
+        with self._stats_lock:
+            stats = dict(self._semantic_stats)
+        return {
+            **stats,
+            "enabled": self.semantic_index is not None,
+            "entries": len(self.semantic_index) if self.semantic_index is not None else 0,
+            "threshold": self.semantic_threshold
+        }
 
     def get_text_embedding(self, text: str) -> np.ndarray:
         """Generate embedding for input text"""
-        inputs = self.tokenizer(
-            text,
-            return_tensors="pt",
-            truncation=True,
-            max_length=512,
-            padding=True
-        ).to(self.device)
+        return self.batch_get_text_embedding([text])
 
-        with torch.no_grad():
-            outputs = self.base_model(**inputs)
-            # Use mean pooling to get sentence embedding
-            embedding = outputs.last_hidden_state.mean(dim=1).cpu().numpy()
-
-        return embedding
+    def batch_get_text_embedding(self, texts: List[str]) -> np.ndarray:
+        """Generate mean-pooled embeddings for multiple texts"""
+        with self._pinned_model():
+            return np.stack([scores['embedding'] for scores in self._score_units(texts, {'embedding'})])
 
     def check_similarity(self, text1: str, text2: str) -> float:
         """Check semantic similarity between two texts"""
-        embedding1 = self.get_text_embedding(text1)
-        embedding2 = self.get_text_embedding(text2)
+        embeddings = self.batch_get_text_embedding([text1, text2])
         
-        similarity = cosine_similarity(embedding1, embedding2)[0][0]
+        similarity = cosine_similarity(embeddings[:1], embeddings[1:])[0][0]
         return float(similarity)
 
-    def analyze_toxicity(self, text: str) -> Dict[str, Union[float, str, List[str]]]:
-        """Analyze text for toxic content"""
-        inputs = self.tokenizer(
-            text,
-            return_tensors="pt",
-            truncation=True,
-            max_length=512,
-            padding=True
-        ).to(self.device)
+    def _tokenize(self, texts: List[str]) -> List[Encoding]:
+        """Token ids and character offsets for each text, batch-encoding only token cache misses"""
+        encodings = self.token_cache.get_many(texts) if self.token_cache is not None else [None] * len(texts)
+        missing = list(dict.fromkeys(text for text, encoding in zip(texts, encodings) if encoding is None))
 
-        with torch.no_grad():
-            outputs = self.toxic_classifier(**inputs)
-            probabilities = torch.softmax(outputs.logits, dim=1)
-            toxic_prob = probabilities[0][1].item()
+        if missing:
+            encoded = self.tokenizer(missing, add_special_tokens=False, return_offsets_mapping=True)
+            fresh = {
+                text: (ids, [tuple(offset) for offset in offsets])
+                for text, ids, offsets in zip(missing, encoded['input_ids'], encoded['offset_mapping'])
+            }
+            if self.token_cache is not None:
+                self.token_cache.put_many(fresh)
+            encodings = [fresh[text] if encoding is None else encoding for text, encoding in zip(texts, encodings)]
 
-        # Get sentiment analysis
-        sentiment = self.sentiment_analyzer(text)[0]
-        
-        # Split text into sentences for more detailed analysis
-        sentences = sent_tokenize(text)
-        toxic_sentences = []
-        
-        for sentence in sentences:
-            sentence_inputs = self.tokenizer(
-                sentence,
-                return_tensors="pt",
-                truncation=True,
-                max_length=512,
-                padding=True
+        return encodings
+
+    def _split_sentences(self, text: str, encoding: Encoding) -> Tuple[List[str], List[List[int]]]:
+        """Split a text into sentences and slice their token ids out of the document encoding"""
+        token_ids, offsets = encoding
+        starts = [start for start, _ in offsets]
+        ends = [end for _, end in offsets]
+
+        sentences, sentence_ids = [], []
+        for start, end in self.sentence_splitter.span_tokenize(text):
+            sentences.append(text[start:end])
+            sentence_ids.append(token_ids[bisect_left(starts, start):bisect_right(ends, end)])
+        return sentences, sentence_ids
+
+    def get_token_cache_metrics(self) -> Dict[str, Any]:
+        """Get token cache counters"""
+        if self.token_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.token_cache.get_metrics()}
+
+    def _windows(self, token_ids: List[int]) -> List[List[int]]:
+        """Split token ids into overlapping windows that fit the model, each wrapped in special tokens"""
+        size = self.max_length - 2
+        if len(token_ids) <= size:
+            return [self.tokenizer.build_inputs_with_special_tokens(token_ids)]
+
+        step = max(1, size - self.window_stride)
+        windows = []
+        for start in range(0, len(token_ids), step):
+            windows.append(self.tokenizer.build_inputs_with_special_tokens(token_ids[start:start + size]))
+            if start + size >= len(token_ids) or len(windows) >= self.max_windows:
+                break
+        return windows
+
+    def _iter_batches(self, rows: List[List[int]]):
+        """Yield padded, length-bucketed model inputs for tokenized rows"""
+        lengths = [len(ids) for ids in rows]
+        for bucket in _length_buckets(lengths, self.batch_size):
+            inputs = self.tokenizer.pad(
+                {'input_ids': [rows[i] for i in bucket]},
+                return_tensors="pt"
             ).to(self.device)
-            
-            with torch.no_grad():
-                sentence_outputs = self.toxic_classifier(**sentence_inputs)
-                sentence_probs = torch.softmax(sentence_outputs.logits, dim=1)
-                if sentence_probs[0][1].item() > 0.7:  # High toxicity threshold
-                    toxic_sentences.append(sentence)
+            yield bucket, inputs
+
+    def _can_exit_early(self) -> bool:
+        """Early exit needs trained exit heads and layer-by-layer access to the eager encoder"""
+        model = self.model
+        return self.early_exit_enabled and model.exit_heads is not None and model.backend.name == "torch"
+
+    def _early_exit_toxicity(self, inputs: Dict[str, torch.Tensor]) -> torch.Tensor:
+        """Run encoder layers one at a time and stop each row at the first confident exit head"""
+        model = self.model
+        attention_mask = inputs['attention_mask']
+        layers = model.encoder.transformer.layer
+        toxic_probs = torch.empty(attention_mask.shape[0])
+        remaining = torch.arange(attention_mask.shape[0], device=self.device)
+
+        with torch.no_grad():
+            hidden_states = model.encoder.embeddings(inputs['input_ids'])
+            for layer_index, layer in enumerate(layers):
+                hidden_states = layer(x=hidden_states, attn_mask=attention_mask)[-1]
+
+                if layer_index == len(layers) - 1:
+                    logits = sequence_classification_logits(model.toxic_classifier, hidden_states)
+                    probs = torch.softmax(logits, dim=1)
+                    exiting = torch.ones(len(remaining), dtype=torch.bool, device=self.device)
+                else:
+                    probs = torch.softmax(model.exit_heads(layer_index, hidden_states), dim=1)
+                    exiting = probs.max(dim=1).values >= self.early_exit_threshold
+
+                toxic_probs[remaining[exiting].cpu()] = probs[exiting, 1].cpu()
+                self._count(self._exit_counts, layer_index, int(exiting.sum()))
+
+                remaining = remaining[~exiting]
+                if len(remaining) == 0:
+                    break
+                hidden_states = hidden_states[~exiting]
+                attention_mask = attention_mask[~exiting]
+
+        return toxic_probs
+
+    def get_early_exit_metrics(self) -> Dict[str, Any]:
+        """Get how many rows left the toxicity classifier at each layer"""
+        with self._stats_lock:
+            exit_counts = list(self._exit_counts)
+        total = sum(exit_counts)
+        return {
+            "enabled": self._can_exit_early(),
+            "threshold": self.early_exit_threshold,
+            "exits_per_layer": {f"layer_{index + 1}": count for index, count in enumerate(exit_counts)},
+            "average_exit_layer": sum((index + 1) * count for index, count in enumerate(exit_counts)) / total if total else None
+        }
+
+    def _run_heads(self, inputs: Dict[str, torch.Tensor], heads: Set[str]) -> Dict[str, torch.Tensor]:
+        """Run the requested heads on one padded batch, returning per-row CPU tensors"""
+        if heads == {'toxicity'} and self._can_exit_early():
+            return {'toxicity': self._early_exit_toxicity(inputs)}
+
+        model = self.model
+        outputs = {}
+        with torch.no_grad():
+            if heads & {'toxicity', 'categories', 'embedding'}:
+                # Shared hidden states feed the toxicity, category and embedding heads
+                hidden_states = model.backend.encode(inputs['input_ids'], inputs['attention_mask'])
+                pooled = mean_pool(hidden_states, inputs['attention_mask'])
+
+            if 'toxicity' in heads:
+                logits = sequence_classification_logits(model.toxic_classifier, hidden_states)
+                outputs['toxicity'] = torch.softmax(logits, dim=1)[:, 1].cpu()
+            if 'categories' in heads and model.category_head is not None:
+                outputs['categories'] = model.category_head.predict(pooled).cpu()
+            if 'embedding' in heads:
+                outputs['embedding'] = pooled.cpu()
+            if 'sentiment' in heads:
+                # The sentiment model is a separate artifact but reuses the same token ids
+                sentiment_logits = model.backend.sentiment_logits(inputs['input_ids'], inputs['attention_mask'])
+                outputs['sentiment'] = torch.softmax(sentiment_logits, dim=1).cpu()
+        return outputs
+
+    def _pool_windows(self, window_outputs: Dict[str, List[torch.Tensor]]) -> Dict[str, Any]:
+        """Aggregate per-window head outputs into a single result for the unit"""
+        reduce = (lambda values: values.max(dim=0).values) if self.window_pooling == 'max' else (lambda values: values.mean(dim=0))
+        scores = {}
+
+        if 'toxicity' in window_outputs:
+            scores['toxicity'] = reduce(torch.stack(window_outputs['toxicity'])).item()
+        if 'categories' in window_outputs:
+            # Without a trained category head there are no category scores (as for lexicon decisions)
+            scores['categories'] = dict(
+                zip(self.model.category_head.categories, reduce(torch.stack(window_outputs['categories'])).tolist())
+            ) if window_outputs['categories'] else None
+        if 'embedding' in window_outputs:
+            scores['embedding'] = torch.stack(window_outputs['embedding']).mean(dim=0).numpy()
+        if 'sentiment' in window_outputs:
+            probs = torch.stack(window_outputs['sentiment']).mean(dim=0)
+            label_id = int(probs.argmax())
+            scores['sentiment'] = {
+                "label": self.sentiment_model.config.id2label[label_id],
+                "score": probs[label_id].item()
+            }
+        return scores
+
+    def _score_units(self, units: List[str], heads: Set[str]) -> List[Dict[str, Any]]:
+        """Tokenize units through the token cache and score them"""
+        return self._score_token_ids([token_ids for token_ids, _ in self._tokenize(units)], heads)
+
+    def _score_token_ids(self, token_ids: List[List[int]], heads: Set[str]) -> List[Dict[str, Any]]:
+        """
+        Encode each tokenized unit once and feed every requested head from it.
+
+        Units longer than the model input are split into overlapping windows that are
+        scored in the same batches and pooled per unit.
+
+        Args:
+            token_ids: Token ids without special tokens, one list per unit (documents, sentences or both)
+            heads: Any of 'toxicity', 'categories', 'embedding' and 'sentiment'
+
+        Returns:
+            One dictionary of head outputs per unit, in input order
+        """
+        if not token_ids:
+            return []
+
+        windows = [self._windows(ids) for ids in token_ids]
+        window_outputs = [{head: [] for head in heads} for _ in token_ids]
+
+        # With max pooling a single window past the reject threshold settles a toxicity-only unit
+        early_stop = self.window_early_stop and self.window_pooling == 'max' and heads <= {'toxicity', 'embedding'}
+
+        # Score the n-th window of every unfinished unit together, so early stops save whole rounds
+        active = list(range(len(token_ids)))
+        round_index = 0
+        while active:
+            owners = [unit for unit in active if round_index < len(windows[unit])]
+            if not owners:
+                break
+
+            rows = [windows[unit][round_index] for unit in owners]
+            for bucket, inputs in self._iter_batches(rows):
+                outputs = self._run_heads(inputs, heads)
+                for position, row in enumerate(bucket):
+                    for head, values in outputs.items():
+                        window_outputs[owners[row]][head].append(values[position])
+
+            if early_stop:
+                owners = [
+                    unit for unit in owners
+                    if max(window_outputs[unit]['toxicity']).item() <= self.reject_threshold
+                ]
+            active = owners
+            round_index += 1
+
+        return [self._pool_windows(outputs) for outputs in window_outputs]
+
+    def _build_toxicity_result(
+        self,
+        toxic_prob: float,
+        sentiment: Dict[str, Union[str, float]],
+        sentences: List[str],
+        sentence_scores: List[float]
+    ) -> Dict[str, Union[float, str, List[str]]]:
+        """Assemble the toxicity analysis for a single text"""
+        toxic_sentences = [
+            sentence for sentence, score in zip(sentences, sentence_scores)
+            if score > self.reject_threshold  # High toxicity threshold
+        ]
 
         return {
             "toxic_probability": toxic_prob,
             "sentiment": sentiment["label"],
             "sentiment_score": sentiment["score"],
             "toxic_sentences": toxic_sentences,
-            "moderation_decision": "reject" if toxic_prob > 0.7 else "approve",
-            "confidence_score": toxic_prob if toxic_prob > 0.5 else (1 - toxic_prob)
+            "moderation_decision": "reject" if toxic_prob > self.reject_threshold else "approve",
+            "confidence_score": toxic_prob if toxic_prob > 0.5 else (1 - toxic_prob),
+            "decided_by": "transformer",
+            "model_version": self.model_version
         }
 
+    def get_cascade_metrics(self) -> Dict[str, Any]:
+        """Get how much traffic each moderation stage decided"""
+        with self._stats_lock:
+            stage_counts = dict(self._stage_counts)
+        total = sum(stage_counts.values())
+        return {
+            "enabled": self.cascade_enabled and self.lexical_model is not None,
+            "approve_below": self.cascade_approve_below,
+            "reject_above": self.cascade_reject_above,
+            "counts": stage_counts,
+            "shares": {stage: count / total for stage, count in stage_counts.items()} if total else {}
+        }
+
+    def _lexicon_precheck(self, texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Settle texts the lexicon matches; None for texts that need the models"""
+        if self.lexicon is None:
+            return [None] * len(texts)
+
+        results = []
+        for text in texts:
+            match = self.lexicon.check(text)
+            if match is None:
+                results.append(None)
+                continue
+            decision, rule_id = match
+            results.append({
+                "toxic_probability": 1.0 if decision == "reject" else 0.0,
+                "sentiment": None,
+                "sentiment_score": None,
+                "toxic_sentences": [],
+                "moderation_decision": decision,
+                "confidence_score": 1.0,
+                "decided_by": "lexicon",
+                "model_version": self.model_version,
+                "lexicon_rule": rule_id
+            })
+        return results
+
+    def _prechecked_batch(self, texts: List[str], analysis_type: str, compute, wrap) -> List[Dict[str, Any]]:
+        """
+        Run the lexicon precheck, then the cached model path for everything it did not settle.
+
+        Lexicon decisions are never cached, so lexicon edits take effect immediately.
+
+        Args:
+            texts: Input texts
+            analysis_type: Result cache analysis type
+            compute: Model analysis for cache misses
+            wrap: Converts a lexicon result into this analysis type's result shape
+        """
+        with self._pinned_model():
+            results = self._lexicon_precheck(texts)
+            self._count(self._stage_counts, "lexicon", sum(1 for result in results if result is not None))
+            pending = [index for index, result in enumerate(results) if result is None]
+            if not pending:
+                return [wrap(text, result) for text, result in zip(texts, results)]
+
+            computed = self._cached_batch([texts[index] for index in pending], analysis_type, compute)
+
+        merged = [wrap(text, result) if result is not None else None for text, result in zip(texts, results)]
+        for index, result in zip(pending, computed):
+            merged[index] = result
+        return merged
+
+    def get_lexicon_metrics(self) -> Dict[str, Any]:
+        """Get lexicon precheck counters"""
+        if self.lexicon is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.lexicon.get_metrics()}
+
+    def _cached_batch(self, texts: List[str], analysis_type: str, compute) -> List[Dict[str, Any]]:
+        """Serve results from the result cache and compute only the distinct misses"""
+        if self.result_cache is None:
+            return compute(texts)
+
+        model_version = self.model_version
+        results = self.result_cache.get_many(texts, analysis_type, model_version)
+        missing = list(dict.fromkeys(text for text, result in zip(texts, results) if result is None))
+
+        if missing:
+            computed = dict(zip(missing, compute(missing)))
+            for text, result in computed.items():
+                self.result_cache.set(text, analysis_type, model_version, result)
+            results = [computed[text] if result is None else result for text, result in zip(texts, results)]
+
+        return results
+
+    def analyze_toxicity(self, text: str) -> Dict[str, Union[float, str, List[str]]]:
+        """Analyze text for toxic content"""
+        return self.batch_analyze_toxicity([text])[0]
+
     def batch_analyze_toxicity(self, texts: List[str]) -> List[Dict[str, Union[float, str, List[str]]]]:
         """Analyze multiple texts for toxic content"""
+        return self._prechecked_batch(texts, 'toxicity', self._batch_analyze_toxicity, lambda text, result: result)
+
+    def _batch_analyze_toxicity(self, texts: List[str]) -> List[Dict[str, Union[float, str, List[str]]]]:
+        """Run the toxicity analysis for texts that missed the cache"""
+        if not texts:
+            return []
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+        if self.cascade_enabled and self.lexical_model is not None:
+            for index, toxic_prob in enumerate(self.lexical_model.predict_proba(texts).tolist()):
+                if toxic_prob <= self.cascade_approve_below:
+                    decision = "approve"
+                elif toxic_prob >= self.cascade_reject_above:
+                    decision = "reject"
+                else:
+                    continue
+
+                self._count(self._stage_counts, f"lexical_{decision}")
+                results[index] = {
+                    "toxic_probability": toxic_prob,
+                    "sentiment": None,
+                    "sentiment_score": None,
+                    "toxic_sentences": [],
+                    "moderation_decision": decision,
+                    "confidence_score": toxic_prob if decision == "reject" else (1 - toxic_prob),
+                    "decided_by": "lexical",
+                    "model_version": self.model_version
+                }
+
+        # Only the uncertain band goes on to the transformer
+        pending = [index for index, result in enumerate(results) if result is None]
+        for index, result in zip(pending, self._transformer_analyze_toxicity([texts[index] for index in pending])):
+            results[index] = result
+        return results
+
+    def _transformer_analyze_toxicity(self, texts: List[str]) -> List[Dict[str, Union[float, str, List[str]]]]:
+        """Run the transformer toxicity analysis"""
+        if not texts:
+            return []
+
+        # One encoder pass per text yields its toxicity and the embedding for near-duplicate lookup
+        heads = {'toxicity', 'embedding'} if self.semantic_index is not None else {'toxicity'}
+        encodings = self._tokenize(texts)
+        text_scores = self._score_token_ids([token_ids for token_ids, _ in encodings], heads)
+
+        # Near-duplicates reuse their neighbour's sentiment: index -> (similarity, sentiment, needs sentences)
+        reused: Dict[int, Tuple[float, Dict[str, Any], bool]] = {}
+
+        if self.semantic_index is not None:
+            for index, scores in enumerate(text_scores):
+                self._count(self._semantic_stats, "lookups")
+                match = self.semantic_index.query(scores['embedding'], self.semantic_threshold)
+                if match is None:
+                    continue
+                similarity, decision = match
+
+                # The verdict is always this text's own, and is only reused when the neighbour reached
+                # the same one (similar embeddings can still have opposite meanings)
+                sentiment = {"label": decision["sentiment"], "score": decision["sentiment_score"]}
+                own = self._build_toxicity_result(scores['toxicity'], sentiment, [], [])
+                if own["moderation_decision"] != decision["moderation_decision"]:
+                    continue
+                self._count(self._semantic_stats, "reused")
+                self._count(self._stage_counts, "semantic_reuse")
+                # This text's toxic_sentences are its own too: they are skipped only for approvals whose
+                # neighbour had none (entries saved before this was recorded count as having some)
+                needs_sentences = own["moderation_decision"] == "reject" or decision.get("has_toxic_sentences", True)
+                reused[index] = (similarity, sentiment, needs_sentences)
+
+        # Texts without a near-duplicate get the sentiment pass; all but clean reused ones the sentence pass
+        fresh = [index for index in range(len(texts)) if index not in reused]
+        split = [index for index in range(len(texts)) if index not in reused or reused[index][2]]
+        splits = {index: self._split_sentences(texts[index], encodings[index]) for index in split}
+        sentiments = dict(zip(fresh, self._score_token_ids([encodings[index][0] for index in fresh], {'sentiment'})))
+        sentence_scores = self._score_token_ids(
+            [ids for index in split for ids in splits[index][1]], {'toxicity'}
+        )
+
+        self._count(self._stage_counts, "transformer", len(fresh))
+        per_text_scores, offset = {}, 0
+        for index in split:
+            count = len(splits[index][0])
+            per_text_scores[index] = [unit['toxicity'] for unit in sentence_scores[offset:offset + count]]
+            offset += count
+
         results = []
-        for text in texts:
-            results.append(self.analyze_toxicity(text))
+        for index, scores in enumerate(text_scores):
+            sentences = splits[index][0] if index in splits else []
+            sentiment = sentiments[index]['sentiment'] if index in sentiments else reused[index][1]
+            result = self._build_toxicity_result(
+                scores['toxicity'], sentiment, sentences, per_text_scores.get(index, [])
+            )
+
+            if index in reused:
+                result.update({"decided_by": "semantic_reuse", "semantic_match": {"similarity": reused[index][0]}})
+            elif self.semantic_index is not None:
+                decision = {key: value for key, value in result.items() if key != "toxic_sentences"}
+                decision["has_toxic_sentences"] = bool(result["toxic_sentences"])
+                self.semantic_index.add(scores['embedding'], decision)
+            results.append(result)
+
         return results
 
     def get_moderation_summary(self, text: str) -> Dict[str, Union[str, float, List[str]]]:
@@ -149,7 +799,7 @@ class ContentModerator:
         return {
             **toxicity_analysis,
             "text_length": len(text),
-            "num_sentences": len(sent_tokenize(text)),
+            "num_sentences": len(self.sentence_splitter.tokenize(text)),
             "moderation_timestamp": datetime.datetime.now().isoformat()
         }
 
@@ -169,65 +819,170 @@ class ContentModerator:
         
         return text
 
-    def analyze_content_type(self, text: str) -> Dict[str, float]:
-        """Analyze content type and return confidence scores for each category"""
-        preprocessed_text = self.preprocess_text(text)
-        
-        # Get embeddings for the text
-        inputs = self.tokenizer(
-            preprocessed_text,
-            return_tensors="pt",
-            truncation=True,
-            max_length=self.max_length,
-            padding=True
-        ).to(self.device)
+    def analyze_content_type(self, text: str) -> Optional[Dict[str, float]]:
+        """Analyze content type and return confidence scores for each category (None without a trained category head)"""
+        return self.batch_analyze_content_type([text])[0]
 
-        with torch.no_grad():
-            # Get base model outputs
-            outputs = self.base_model(**inputs)
-            embeddings = outputs.last_hidden_state.mean(dim=1)
-            
-            # Get predictions for each category
-            category_scores = {}
-            for category in self.categories:
-                category_outputs = self.toxic_classifier(inputs_embeds=embeddings)
-                probabilities = torch.softmax(category_outputs.logits, dim=1)
-                category_scores[category] = probabilities[0][1].item()
-
-        return category_scores
+    def batch_analyze_content_type(self, texts: List[str]) -> List[Optional[Dict[str, float]]]:
+        """Score every category for each text in a single forward pass per batch"""
+        with self._pinned_model():
+            return [scores['categories'] for scores in self._score_units(texts, {'categories'})]
 
     def get_detailed_analysis(self, text: str) -> Dict[str, Any]:
         """Perform detailed content analysis"""
-        basic_analysis = self.analyze_toxicity(text)
-        content_types = self.analyze_content_type(text)
-        sentiment = self.sentiment_analyzer(text)[0]
-        
-        # Split into sentences and analyze each
-        sentences = sent_tokenize(text)
-        sentence_analysis = []
-        
-        for sentence in sentences:
-            sentence_scores = self.analyze_content_type(sentence)
-            sentence_sentiment = self.sentiment_analyzer(sentence)[0]
-            
-            sentence_analysis.append({
-                'text': sentence,
-                'scores': sentence_scores,
-                'sentiment': sentence_sentiment
-            })
+        return self.batch_get_detailed_analysis([text])[0]
+
+    def batch_get_detailed_analysis(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """Perform detailed content analysis for multiple texts"""
+        return self._prechecked_batch(texts, 'detailed', self._batch_get_detailed_analysis, self._lexicon_detailed_result)
 
+    @staticmethod
+    def _lexicon_detailed_result(text: str, basic_analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """Shape a lexicon decision like a detailed analysis"""
         return {
             'overall_analysis': basic_analysis,
-            'content_type_scores': content_types,
-            'sentiment': sentiment,
-            'sentence_level_analysis': sentence_analysis,
+            'content_type_scores': None,
+            'sentiment': None,
+            'sentence_level_analysis': [],
             'metadata': {
                 'text_length': len(text),
-                'sentence_count': len(sentences),
-                'analysis_timestamp': datetime.now().isoformat()
+                'sentence_count': 0,
+                'analysis_timestamp': datetime.datetime.now().isoformat(),
+                'model_version': basic_analysis['model_version']
             }
         }
 
+    def _batch_get_detailed_analysis(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """Run the detailed analysis for texts that missed the cache"""
+        if not texts:
+            return []
+
+        # Tokenize each text once, slice its sentences out of it and run all heads in one pass
+        encodings = self._tokenize(texts)
+        splits = [self._split_sentences(text, encoding) for text, encoding in zip(texts, encodings)]
+        sentences_per_text = [sentences for sentences, _ in splits]
+        unit_scores = self._score_token_ids(
+            [token_ids for token_ids, _ in encodings] + [ids for _, sentence_ids in splits for ids in sentence_ids],
+            {'toxicity', 'categories', 'sentiment'}
+        )
+        sentence_scores = unit_scores[len(texts):]
+
+        results = []
+        offset = 0
+        for text, scores, sentences in zip(texts, unit_scores, sentences_per_text):
+            own_sentence_scores = sentence_scores[offset:offset + len(sentences)]
+            offset += len(sentences)
+
+            basic_analysis = self._build_toxicity_result(
+                scores['toxicity'],
+                scores['sentiment'],
+                sentences,
+                [unit['toxicity'] for unit in own_sentence_scores]
+            )
+            sentence_analysis = [
+                {
+                    'text': sentence,
+                    'toxic_probability': unit['toxicity'],
+                    'scores': unit['categories'],
+                    'sentiment': unit['sentiment']
+                }
+                for sentence, unit in zip(sentences, own_sentence_scores)
+            ]
+
+            results.append({
+                'overall_analysis': basic_analysis,
+                'content_type_scores': scores['categories'],
+                'sentiment': scores['sentiment'],
+                'sentence_level_analysis': sentence_analysis,
+                'metadata': {
+                    'text_length': len(text),
+                    'sentence_count': len(sentences),
+                    'analysis_timestamp': datetime.datetime.now().isoformat(),
+                    'model_version': self.model_version
+                }
+            })
+
+        return results
+
+    def iter_detailed_analysis(self, text: str) -> Iterator[Dict[str, Any]]:
+        """
+        Yield a detailed analysis incrementally for streaming.
+
+        The overall verdict comes first, then sentence results one batch at a time, then a
+        final "done" event. Each step does a bounded amount of model work, so a consumer
+        that stops iterating (for example after a client disconnects) stops the analysis.
+        Events from the same analysis always come from one model version.
+        """
+        if not self._loaded:
+            self.load()
+
+        model = self._acquire_active()
+        try:
+            with self._pinned_model(model):
+                precheck = self._lexicon_precheck([text])[0]
+                if precheck is not None:
+                    self._count(self._stage_counts, "lexicon")
+                    cached = self._lexicon_detailed_result(text, precheck)
+                elif self.result_cache is not None:
+                    cached = self.result_cache.get(text, 'detailed', model.version)
+                else:
+                    cached = None
+
+            if cached is not None:
+                yield {'event': 'overall', **{key: value for key, value in cached.items() if key != 'sentence_level_analysis'}}
+                for index, sentence in enumerate(cached['sentence_level_analysis']):
+                    yield {'event': 'sentence', 'index': index, **sentence}
+                yield {'event': 'done', 'toxic_sentences': cached['overall_analysis']['toxic_sentences']}
+                return
+
+            with self._pinned_model(model):
+                encoding = self._tokenize([text])[0]
+                scores = self._score_token_ids([encoding[0]], {'toxicity', 'categories', 'sentiment'})[0]
+                sentences, sentence_ids = self._split_sentences(text, encoding)
+                basic_analysis = self._build_toxicity_result(scores['toxicity'], scores['sentiment'], [], [])
+            overall = {
+                'overall_analysis': basic_analysis,
+                'content_type_scores': scores['categories'],
+                'sentiment': scores['sentiment'],
+                'metadata': {
+                    'text_length': len(text),
+                    'sentence_count': len(sentences),
+                    'analysis_timestamp': datetime.datetime.now().isoformat(),
+                    'model_version': model.version
+                }
+            }
+            yield {'event': 'overall', **overall}
+
+            sentence_analysis = []
+            for start in range(0, len(sentences), self.batch_size):
+                with self._pinned_model(model):
+                    batch_scores = self._score_token_ids(
+                        sentence_ids[start:start + self.batch_size],
+                        {'toxicity', 'categories', 'sentiment'}
+                    )
+                for offset, unit in enumerate(batch_scores):
+                    sentence = {
+                        'text': sentences[start + offset],
+                        'toxic_probability': unit['toxicity'],
+                        'scores': unit['categories'],
+                        'sentiment': unit['sentiment']
+                    }
+                    sentence_analysis.append(sentence)
+                    yield {'event': 'sentence', 'index': start + offset, **sentence}
+
+            toxic_sentences = [
+                sentence['text'] for sentence in sentence_analysis
+                if sentence['toxic_probability'] > self.reject_threshold
+            ]
+            yield {'event': 'done', 'toxic_sentences': toxic_sentences}
+
+            # A completed stream is as good as a batch analysis, so later requests can reuse it
+            if self.result_cache is not None:
+                basic_analysis['toxic_sentences'] = toxic_sentences
+                self.result_cache.set(text, 'detailed', model.version, {**overall, 'sentence_level_analysis': sentence_analysis})
+        finally:
+            model.release()
+
     @staticmethod
     def get_model_info() -> Dict[str, str]:
         """Get information about the current model configuration"""
@@ -242,3 +997,22 @@ class ContentModerator:
                 "semantic_similarity"
             ]
         }
+
+_content_moderator: Optional[ContentModerator] = None
+_moderator_lock = threading.Lock()
+
+def get_content_moderator(load: bool = True) -> ContentModerator:
+    """
+    Get the process-wide ContentModerator backed by the shared model registry.
+
+    Args:
+        load: Load the models now; pass False to get the handle and load it later
+            with initialize() or on first use
+    """
+    global _content_moderator
+    with _moderator_lock:
+        if _content_moderator is None:
+            _content_moderator = ContentModerator()
+    if load:
+        _content_moderator.load()
+    return _content_moderator
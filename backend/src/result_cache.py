@@ -0,0 +1,138 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import redis
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """Two-tier cache of moderation results: in-process LRU backed by Redis"""
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_seconds: int = 3600,
+        redis_url: Optional[str] = None,
+        namespace: str = "moderation_cache"
+    ):
+        """
+        Create the cache.
+
+        Args:
+            max_entries: Maximum number of results kept in process
+            ttl_seconds: Lifetime of a cached result in both tiers
+            redis_url: Redis connection URL for the shared tier, or None to disable it
+            namespace: Prefix for Redis keys
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.namespace = namespace
+        self.redis_client = redis.Redis.from_url(redis_url) if redis_url else None
+
+        self._local: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def make_key(self, text: str, analysis_type: str, model_version: str) -> str:
+        """
+        Content-addressed key for a text, analysis type and model version.
+
+        Keyed on the exact text: results carry text-dependent fields (sentences, toxic_sentences,
+        text_length), so even whitespace variants must not share an entry.
+        """
+        digest = hashlib.sha256(
+            "\x1f".join([model_version, analysis_type, text]).encode('utf-8')
+        ).hexdigest()
+        return f"{self.namespace}:{digest}"
+
+    def get(self, text: str, analysis_type: str, model_version: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached result, checking the local tier before Redis"""
+        return self.get_many([text], analysis_type, model_version)[0]
+
+    def get_many(self, texts: List[str], analysis_type: str, model_version: str) -> List[Optional[Dict[str, Any]]]:
+        """Look up several results, resolving local misses with a single Redis round trip"""
+        keys = [self.make_key(text, analysis_type, model_version) for text in texts]
+        payloads: List[Optional[str]] = [None] * len(keys)
+        now = time.monotonic()
+
+        with self._lock:
+            for index, key in enumerate(keys):
+                entry = self._local.get(key)
+                if entry is None:
+                    continue
+                expires_at, payload = entry
+                if expires_at > now:
+                    self._local.move_to_end(key)
+                    self._stats["local_hits"] += 1
+                    payloads[index] = payload
+                else:
+                    del self._local[key]
+
+        remote = [index for index, payload in enumerate(payloads) if payload is None]
+        if remote and self.redis_client is not None:
+            try:
+                values = self.redis_client.mget([keys[index] for index in remote])
+            except redis.RedisError as e:
+                logger.warning(f"Result cache Redis lookup failed: {str(e)}")
+                values = [None] * len(remote)
+
+            with self._lock:
+                for index, value in zip(remote, values):
+                    if value is not None:
+                        payloads[index] = value.decode('utf-8')
+                        self._stats["redis_hits"] += 1
+                        self._store_local(keys[index], payloads[index])
+
+        with self._lock:
+            self._stats["misses"] += sum(1 for payload in payloads if payload is None)
+
+        return [json.loads(payload) if payload is not None else None for payload in payloads]
+
+    def set(self, text: str, analysis_type: str, model_version: str, result: Dict[str, Any]):
+        """Store a result in both tiers"""
+        key = self.make_key(text, analysis_type, model_version)
+        payload = json.dumps(result)
+
+        with self._lock:
+            self._store_local(key, payload)
+
+        if self.redis_client is not None:
+            try:
+                self.redis_client.setex(key, self.ttl_seconds, payload)
+            except redis.RedisError as e:
+                logger.warning(f"Result cache Redis write failed: {str(e)}")
+
+    def _store_local(self, key: str, payload: str):
+        """Insert into the LRU tier, evicting the oldest entries past capacity (lock held)"""
+        self._local[key] = (time.monotonic() + self.ttl_seconds, payload)
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def invalidate(self):
+        """Drop every local entry; Redis entries are orphaned by the new model version in their keys"""
+        with self._lock:
+            self._local.clear()
+            self._stats["invalidations"] += 1
+        logger.info("Result cache invalidated")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get hit/miss counters and current size"""
+        with self._lock:
+            hits = self._stats["local_hits"] + self._stats["redis_hits"]
+            lookups = hits + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._local),
+                "max_entries": self.max_entries,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "redis_enabled": self.redis_client is not None
+            }
@@ -0,0 +1,90 @@
+import gc
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import torch
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ServingModel:
+    """One version of the toxicity model and everything derived from its weights"""
+
+    def __init__(
+        self,
+        version: str,
+        toxic_classifier: torch.nn.Module,
+        backend: Any,
+        exit_heads: Optional[torch.nn.Module] = None,
+        backend_parity: Optional[Dict[str, float]] = None,
+        category_head: Optional[torch.nn.Module] = None
+    ):
+        """
+        Bundle a model version; it is never mutated after construction.
+
+        Args:
+            version: Version string reported with every result
+            toxic_classifier: DistilBertForSequenceClassification holding this version's weights
+            backend: Inference backend built from this version's encoder
+            exit_heads: Early-exit heads trained against this version, if any
+            backend_parity: Parity of the backend against the eager model
+            category_head: Category head trained on this version's encoder, if any
+        """
+        self.version = version
+        self.toxic_classifier = toxic_classifier
+        self.encoder = toxic_classifier.distilbert
+        self.backend = backend
+        self.exit_heads = exit_heads
+        self.backend_parity = backend_parity
+        self.category_head = category_head
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._retired = False
+
+    def acquire(self) -> bool:
+        """
+        Mark a request as running on this version.
+
+        Returns False once the version is retired and drained (its memory is being freed);
+        the caller should acquire the new active version instead.
+        """
+        with self._lock:
+            if self._retired and self._in_flight == 0:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release(self):
+        """Mark a request as finished, freeing a retired version once it drains"""
+        with self._lock:
+            self._in_flight -= 1
+            drained = self._retired and self._in_flight == 0
+        if drained:
+            self._free()
+
+    def retire(self):
+        """Stop serving this version; its memory is freed after in-flight requests finish"""
+        with self._lock:
+            self._retired = True
+            drained = self._in_flight == 0
+        if drained:
+            self._free()
+
+    def _free(self):
+        self.toxic_classifier = None
+        self.encoder = None
+        self.backend = None
+        self.exit_heads = None
+        self.category_head = None
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        logger.info(f"Released model version {self.version}")
+
+    def get_info(self) -> Dict[str, Any]:
+        """Get the version and how many requests are using it"""
+        with self._lock:
+            return {"version": self.version, "in_flight": self._in_flight, "retired": self._retired}
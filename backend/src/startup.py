@@ -0,0 +1,85 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict
+
+import nltk
+
+from config import settings
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class StartupProfile:
+    """Wall-clock time spent initializing each lazily created component"""
+
+    def __init__(self):
+        self._timings: Dict[str, float] = {}
+        self._top_level: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._created_at = time.monotonic()
+
+    @contextmanager
+    def measure(self, component: str):
+        """Time the initialization of a component; components may nest"""
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._local.depth = depth
+            with self._lock:
+                self._timings[component] = self._timings.get(component, 0.0) + elapsed
+                self._top_level[component] = self._top_level.get(component, True) and depth == 0
+            logger.info(f"Initialized {component} in {elapsed:.2f}s")
+
+    def get_report(self) -> Dict[str, Any]:
+        """Get per-component initialization times, slowest first"""
+        with self._lock:
+            timings = sorted(self._timings.items(), key=lambda item: item[1], reverse=True)
+            # Nested components are already included in their parent's time
+            total = sum(seconds for component, seconds in timings if self._top_level[component])
+        return {
+            "components": {component: round(seconds, 3) for component, seconds in timings},
+            "total_seconds": round(total, 3),
+            "process_uptime_seconds": round(time.monotonic() - self._created_at, 3)
+        }
+
+    def log_report(self):
+        """Log the per-component breakdown"""
+        report = self.get_report()
+        lines = [f"  {component}: {seconds:.3f}s" for component, seconds in report["components"].items()]
+        logger.info(f"Startup profile (total {report['total_seconds']:.3f}s):\n" + "\n".join(lines))
+
+startup_profile = StartupProfile()
+
+_punkt_lock = threading.Lock()
+_punkt_ready = False
+
+def ensure_punkt():
+    """
+    Make sure the punkt sentence tokenizer is installed.
+
+    Looks the model up locally first and only downloads it when it is missing and
+    NLTK_AUTO_DOWNLOAD is enabled, so offline hosts never touch the network.
+    """
+    global _punkt_ready
+    with _punkt_lock:
+        if _punkt_ready:
+            return
+        with startup_profile.measure("nltk_punkt"):
+            try:
+                nltk.data.find('tokenizers/punkt')
+            except LookupError:
+                if not settings.NLTK_AUTO_DOWNLOAD:
+                    raise RuntimeError(
+                        "NLTK punkt tokenizer is not installed; run `python -m nltk.downloader punkt` "
+                        "or set NLTK_AUTO_DOWNLOAD=true"
+                    )
+                nltk.download('punkt', quiet=True)
+        _punkt_ready = True
@@ -1,43 +1,71 @@
 from celery import Celery
+from celery.signals import worker_init
 from google.cloud import storage
-from model_utils import ContentModerator
+from model_utils import CUSTOM_WEIGHTS_PATH, get_content_moderator
+from weights_io import convert_to_safetensors
+from cloud_storage import get_cloud_storage
+from model_sync import get_model_sync
 import logging
 import json
 from datetime import datetime
 from pathlib import Path
 import os
-from typing import Dict, Any, List
+import shutil
+from typing import Dict, Any, List, Optional
+import threading
 import redis
 
+from config import settings
+from startup import startup_profile
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Redis
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
-
 # Initialize Celery
 celery_app = Celery('tasks', broker='redis://localhost:6379/0')
 
-# Initialize Google Cloud Storage
-storage_client = storage.Client()
 bucket_name = os.getenv('GOOGLE_CLOUD_BUCKET', 'fsociety-ai-models')
-bucket = storage_client.bucket(bucket_name)
 
-# Initialize content moderator
-moderator = ContentModerator()
+# Clients are created on first use, so importing tasks (e.g. for Celery beat or to enqueue) stays cheap
+_redis_client: Optional[redis.Redis] = None
+_bucket: Optional[storage.Bucket] = None
+_clients_lock = threading.Lock()
+
+def get_redis_client() -> redis.Redis:
+    """Redis connection for task results"""
+    global _redis_client
+    with _clients_lock:
+        if _redis_client is None:
+            with startup_profile.measure("redis"):
+                _redis_client = redis.Redis(host='localhost', port=6379, db=0)
+        return _redis_client
+
+def get_bucket() -> storage.Bucket:
+    """GCS bucket holding model weights and training results"""
+    global _bucket
+    with _clients_lock:
+        if _bucket is None:
+            with startup_profile.measure("gcs"):
+                _bucket = storage.Client().bucket(bucket_name)
+        return _bucket
+
+@worker_init.connect
+def preload_models(**kwargs):
+    """Load the models in the Celery parent process so prefork pool children share their pages"""
+    get_content_moderator()
+    startup_profile.log_report()
 
 @celery_app.task
 def analyze_text_batch(texts: List[str], batch_id: str) -> Dict[str, Any]:
     """Analyze a batch of texts asynchronously"""
     try:
-        results = []
-        for text in texts:
-            analysis = moderator.get_detailed_analysis(text)
-            results.append(analysis)
+        # Follow swaps published by sync_model_weights running in another worker
+        get_model_sync().sync()
+        results = get_content_moderator().batch_get_detailed_analysis(texts)
 
         # Store results in Redis with 1-hour expiration
-        redis_client.setex(
+        get_redis_client().setex(
             f"batch_results:{batch_id}",
             3600,  # 1 hour
             json.dumps(results)
@@ -56,15 +84,36 @@ def analyze_text_batch(texts: List[str], batch_id: str) -> Dict[str, Any]:
             "error": str(e)
         }
 
-@celery_app.task
+# Redelivered if the worker dies mid-run; training then resumes from its latest checkpoint
+@celery_app.task(acks_late=True, reject_on_worker_lost=True)
 def train_model_async(
     file_path: str,
     config: Dict[str, Any],
     training_id: str
 ) -> Dict[str, Any]:
-    """Train model asynchronously"""
+    """
+    Train model asynchronously.
+
+    Args:
+        file_path: Local training data file, or the cloud storage path returned by
+            CloudStorage.upload_training_data, which is downloaded first
+        config: ModelTrainer arguments, plus an optional "streaming" flag
+        training_id: Training run id, also naming its checkpoints
+    """
     try:
         from train import ModelTrainer
+        from checkpointing import CheckpointManager
+        
+        # Uploads arrive as cloud storage objects; train from a local copy
+        if not os.path.exists(file_path):
+            file_path = get_cloud_storage().download_training_data(
+                file_path,
+                str(Path("training_data") / f"{training_id}{Path(file_path).suffix}")
+            )
+        
+        # Large files are streamed; config may force either mode with "streaming"
+        config = dict(config)
+        streaming = config.pop('streaming', os.path.getsize(file_path) >= settings.TRAIN_STREAMING_MIN_BYTES)
         
         # Initialize trainer
         trainer = ModelTrainer(**config)
@@ -73,11 +122,18 @@ def train_model_async(
         train_loader, val_loader = trainer.prepare_data(
             file_path,
             'text',
-            'label'
+            'label',
+            streaming=streaming
         )
         
-        # Train model
-        history = trainer.train(train_loader, val_loader)
+        # Train model, checkpointing to cloud storage so a restarted task resumes where it stopped
+        checkpoints = CheckpointManager(
+            str(Path("checkpoints") / training_id),
+            cloud_storage=get_cloud_storage(),
+            run_id=training_id
+        )
+        history = trainer.train(train_loader, val_loader, checkpoints=checkpoints)
+        checkpoints.close()
         
         # Evaluate model
         metrics = trainer.evaluate_model(val_loader)
@@ -92,14 +148,15 @@ def train_model_async(
             json.dump(metrics, f)
         
         # Upload results to Google Cloud Storage
-        blob = bucket.blob(f"training_results/{training_id}/model.pt")
-        blob.upload_from_filename(str(Path("weights") / "toxic_classifier.pt"))
+        bucket = get_bucket()
+        blob = bucket.blob(f"training_results/{training_id}/toxic_classifier.safetensors")
+        blob.upload_from_filename(str(Path("weights") / "toxic_classifier.safetensors"))
         
         blob = bucket.blob(f"training_results/{training_id}/metrics.json")
         blob.upload_from_filename(str(results_dir / "metrics.json"))
         
         # Store status in Redis
-        redis_client.setex(
+        get_redis_client().setex(
             f"training_status:{training_id}",
             86400,  # 24 hours
             json.dumps({
@@ -111,6 +168,7 @@ def train_model_async(
         
         # Cleanup
         Path(file_path).unlink()
+        shutil.rmtree(Path("checkpoints") / training_id, ignore_errors=True)
         
         return {
             "status": "success",
@@ -119,7 +177,7 @@ def train_model_async(
         }
     except Exception as e:
         logger.error(f"Training error: {str(e)}")
-        redis_client.setex(
+        get_redis_client().setex(
             f"training_status:{training_id}",
             86400,  # 24 hours
             json.dumps({
@@ -135,19 +193,38 @@ def train_model_async(
         }
 
 @celery_app.task
-def sync_model_weights():
-    """Sync model weights with Google Cloud Storage"""
+def sync_model_weights(version: Optional[str] = None):
+    """
+    Sync model weights with Google Cloud Storage and have every serving process switch to them.
+
+    Args:
+        version: Model version to fetch, defaults to the latest release
+    """
     try:
-        # Download latest weights
-        blob = bucket.blob("models/latest/toxic_classifier.pt")
-        weights_path = Path("weights") / "toxic_classifier.pt"
-        blob.download_to_filename(str(weights_path))
+        # Download next to the live weights and rename, so no reader sees a partial file
+        weights_path = Path(CUSTOM_WEIGHTS_PATH)
+        prefix = f"models/{version or 'latest'}"
+        bucket = get_bucket()
+        blob = bucket.blob(f"{prefix}/toxic_classifier.safetensors")
+        if blob.exists():
+            tmp_path = weights_path.with_suffix(".safetensors.tmp")
+            blob.download_to_filename(str(tmp_path))
+            os.replace(tmp_path, weights_path)
+        else:
+            # Older releases only published torch.save checkpoints; convert so workers can mmap them
+            tmp_path = weights_path.with_suffix(".pt.tmp")
+            bucket.blob(f"{prefix}/toxic_classifier.pt").download_to_filename(str(tmp_path))
+            convert_to_safetensors(str(tmp_path), str(weights_path))
+            tmp_path.unlink()
         
-        # Reload model with new weights
-        moderator._load_custom_weights()
+        # Load and warm up the new version, then swap it in without interrupting requests
+        model_version = get_content_moderator().reload_weights(str(weights_path))
+        # This only swapped this worker; the API processes and other workers reload on seeing the version
+        get_model_sync().publish(model_version)
         
         return {
             "status": "success",
+            "model_version": model_version,
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
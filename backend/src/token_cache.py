@@ -0,0 +1,57 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Token ids and (start, end) character offsets of one text
+Encoding = Tuple[List[int], List[Tuple[int, int]]]
+
+class TokenCache:
+    """In-process LRU of tokenizer output keyed by text hash, shared by every head"""
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, Encoding]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def get_many(self, texts: List[str]) -> List[Optional[Encoding]]:
+        """Look up cached encodings, None for misses"""
+        results = []
+        with self._lock:
+            for text in texts:
+                key = self._key(text)
+                entry = self._entries.get(key)
+                if entry is None:
+                    self._stats["misses"] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                results.append(entry)
+        return results
+
+    def put_many(self, encodings: Dict[str, Encoding]):
+        """Store encodings, evicting the least recently used entries past capacity"""
+        with self._lock:
+            for text, encoding in encodings.items():
+                key = self._key(text)
+                self._entries[key] = encoding
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get hit/miss counters and current size"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0
+            }
@@ -0,0 +1,483 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import shutil
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import Dataset, IterableDataset, Sampler, get_worker_info
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def iter_records(data_path: str, columns: List[str], chunk_size: int = 50000) -> Iterator[pd.DataFrame]:
+    """Read a CSV, Parquet or JSON Lines file in chunks of at most chunk_size rows"""
+    extension = os.path.splitext(data_path)[1].lower()
+    if extension == '.parquet':
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(data_path).iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    elif extension in ('.jsonl', '.ndjson', '.json'):
+        for chunk in pd.read_json(data_path, lines=True, chunksize=chunk_size):
+            yield chunk[columns]
+    else:
+        yield from pd.read_csv(data_path, usecols=columns, chunksize=chunk_size)
+
+def is_validation_key(key: str, test_size: float) -> bool:
+    """Stable hash split, so every pass and every process agrees on a row's split"""
+    return zlib.crc32(key.encode('utf-8')) % 10000 < test_size * 10000
+
+def continuation_mask(tokenizer) -> np.ndarray:
+    """Vocabulary mask of WordPiece continuations ("##ing"), which belong to the preceding word"""
+    return np.array(
+        [token.startswith('##') for token in tokenizer.convert_ids_to_tokens(list(range(len(tokenizer))))],
+        dtype=bool
+    )
+
+def augment_token_ids(ids: np.ndarray, is_continuation: np.ndarray) -> np.ndarray:
+    """Word-level random deletion or swap, matching TextAugmenter but without re-tokenizing"""
+    starts = np.flatnonzero(~is_continuation[ids])
+    if len(starts) < 2:
+        return ids
+    words = np.split(ids, starts[1:]) if starts[0] == 0 else np.split(ids, starts)
+
+    if random.random() < 0.5:
+        kept = [word for word in words if random.random() > 0.1]
+        words = kept or [random.choice(words)]
+    else:
+        first, second = random.sample(range(len(words)), 2)
+        words[first], words[second] = words[second], words[first]
+    return np.concatenate(words)
+
+def _cache_key(data_path: str, text_column: str, label_column: str, tokenizer, max_length: int) -> str:
+    """Hash of the dataset contents and everything that affects its tokenization"""
+    digest = hashlib.sha256()
+    with open(data_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    digest.update(json.dumps({
+        "text_column": text_column,
+        "label_column": label_column,
+        "tokenizer": [type(tokenizer).__name__, tokenizer.name_or_path, len(tokenizer)],
+        "max_length": max_length
+    }, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def build_token_cache(
+    data_path: str,
+    text_column: str,
+    label_column: str,
+    tokenizer,
+    max_length: int = 512,
+    cache_dir: str = 'data/token_cache',
+    chunk_size: int = 50000
+) -> str:
+    """
+    Tokenize a CSV, Parquet or JSON Lines corpus once into memory-mappable arrays, reusing an earlier run when possible.
+
+    Rows are streamed in chunks and batch-encoded by the fast tokenizer, which spreads each
+    chunk across all cores. Token ids are stored unpadded and without special tokens in one
+    flat file with per-row offsets; attention masks follow from the row lengths.
+
+    Args:
+        data_path: Dataset file
+        text_column: Column holding the text
+        label_column: Column holding the integer label
+        tokenizer: Fast tokenizer used for training
+        max_length: Model input length including the two special tokens
+        cache_dir: Directory holding one subdirectory per cache key
+        chunk_size: Rows read and tokenized at a time
+
+    Returns:
+        Path of the cache directory for this dataset, tokenizer and max_length
+    """
+    path = os.path.join(cache_dir, _cache_key(data_path, text_column, label_column, tokenizer, max_length))
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        logger.info(f"Reusing tokenized dataset cache {path}")
+        return path
+
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    id_dtype = np.uint16 if len(tokenizer) <= np.iinfo(np.uint16).max else np.uint32
+    lengths, labels = [], []
+    with open(os.path.join(tmp_path, 'input_ids.bin'), 'wb') as ids_file:
+        for chunk in iter_records(data_path, [text_column, label_column], chunk_size):
+            encoded = tokenizer(
+                chunk[text_column].astype(str).tolist(),
+                add_special_tokens=False,
+                truncation=True,
+                max_length=max_length - 2
+            )['input_ids']
+            for ids in encoded:
+                ids_file.write(np.asarray(ids, dtype=id_dtype).tobytes())
+                lengths.append(len(ids))
+            labels.extend(chunk[label_column].astype(int).tolist())
+            logger.info(f"Tokenized {len(lengths)} rows")
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    np.save(os.path.join(tmp_path, 'offsets.npy'), offsets)
+    np.save(os.path.join(tmp_path, 'labels.npy'), np.asarray(labels, dtype=np.int64))
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump({
+            "data_path": data_path,
+            "rows": len(lengths),
+            "tokens": int(offsets[-1]),
+            "id_dtype": np.dtype(id_dtype).name,
+            "max_length": max_length
+        }, f, indent=2)
+
+    # meta.json marks a complete cache, so an interrupted build is never reused
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote tokenized dataset cache {path}")
+    return path
+
+def load_token_cache_meta(path: str) -> Dict[str, Any]:
+    """Read the summary written with a token cache"""
+    with open(os.path.join(path, 'meta.json')) as f:
+        return json.load(f)
+
+class TokenizedDataset(Dataset):
+    """Rows of a token cache, read zero-copy from memory-mapped arrays"""
+
+    def __init__(
+        self,
+        cache_path: str,
+        indices: Sequence[int],
+        tokenizer,
+        augment: bool = False,
+        label_dtype: torch.dtype = torch.long
+    ):
+        """
+        Create a view over some rows of a token cache.
+
+        Args:
+            cache_path: Directory returned by build_token_cache
+            indices: Rows in this dataset (e.g. one side of a train/validation split)
+            tokenizer: Tokenizer the cache was built with, for special and continuation tokens
+            augment: Apply word-level random deletion and swap on the token ids
+            label_dtype: Tensor dtype of the labels
+        """
+        self.cache_path = cache_path
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.meta = load_token_cache_meta(cache_path)
+        self.max_length = self.meta['max_length']
+        self.augment = augment
+        self.label_dtype = label_dtype
+
+        self.cls_id = tokenizer.cls_token_id
+        self.sep_id = tokenizer.sep_token_id
+        self.is_continuation = continuation_mask(tokenizer)
+
+        self._arrays = None
+
+    def _open(self):
+        """Map the arrays lazily, so each DataLoader worker maps them itself instead of receiving a copy"""
+        if self._arrays is None:
+            self._arrays = (
+                np.memmap(os.path.join(self.cache_path, 'input_ids.bin'), dtype=self.meta['id_dtype'], mode='r'),
+                np.load(os.path.join(self.cache_path, 'offsets.npy'), mmap_mode='r'),
+                np.load(os.path.join(self.cache_path, 'labels.npy'), mmap_mode='r')
+            )
+        return self._arrays
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    def __len__(self):
+        return len(self.indices)
+
+    def get_lengths(self) -> np.ndarray:
+        """Token count of every row including special tokens, without reading any ids"""
+        _, offsets, _ = self._open()
+        return np.diff(offsets)[self.indices] + 2
+
+    def __getitem__(self, idx):
+        input_ids, offsets, labels = self._open()
+        row = self.indices[idx]
+        ids = np.asarray(input_ids[offsets[row]:offsets[row + 1]], dtype=np.int64)
+
+        # Apply augmentation if enabled
+        if self.augment and random.random() < 0.3:  # 30% chance of augmentation
+            ids = augment_token_ids(ids, self.is_continuation)
+
+        # Padding is left to PaddingCollator, which pads to the longest row in the batch
+        ids = np.concatenate(([self.cls_id], ids, [self.sep_id]))
+
+        return {
+            'input_ids': torch.from_numpy(ids),
+            'attention_mask': torch.ones(len(ids), dtype=torch.long),
+            'label': torch.tensor(int(labels[row]), dtype=self.label_dtype)
+        }
+
+class StreamingTextDataset(IterableDataset):
+    """
+    One split of a dataset file, tokenized on the fly while streaming it from disk.
+
+    Rows are read in chunks and assigned to a split by hashing their key, so memory stays
+    bounded by the chunk size and the shuffle buffer no matter how large the file is.
+    Chunks are dealt round-robin to replicas and then to each replica's DataLoader workers.
+    """
+
+    def __init__(
+        self,
+        data_path: str,
+        text_column: str,
+        label_column: str,
+        tokenizer,
+        max_length: int = 512,
+        split: str = 'train',
+        test_size: float = 0.2,
+        key_column: Optional[str] = None,
+        shuffle_buffer: int = 10000,
+        augment: bool = False,
+        chunk_size: int = 10000,
+        seed: int = 42,
+        num_replicas: int = 1,
+        rank: int = 0
+    ):
+        """
+        Args:
+            data_path: CSV, Parquet or JSON Lines file
+            text_column: Column holding the text
+            label_column: Column holding the integer label
+            tokenizer: Fast tokenizer used for training
+            max_length: Model input length including the two special tokens
+            split: 'train' or 'validation'
+            test_size: Fraction of rows hashed into the validation split
+            key_column: Column hashed for the split (defaults to the text, keeping duplicates together)
+            shuffle_buffer: Rows held for shuffling; 0 streams in file order
+            augment: Apply word-level random deletion and swap on the token ids
+            chunk_size: Rows read and tokenized at a time
+            seed: Base seed of the shuffle, advanced every epoch
+            num_replicas: Data-parallel replicas sharing the file
+            rank: This replica's rank; it reads every num_replicas-th chunk
+        """
+        if split not in ('train', 'validation'):
+            raise ValueError(f"Unknown split: {split}")
+        self.data_path = data_path
+        self.text_column = text_column
+        self.label_column = label_column
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.split = split
+        self.test_size = test_size
+        self.key_column = key_column or text_column
+        self.shuffle_buffer = shuffle_buffer
+        self.augment = augment
+        self.chunk_size = chunk_size
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+        self.is_continuation = continuation_mask(tokenizer)
+        self._num_rows = None
+
+    def set_epoch(self, epoch: int):
+        """Reseed the shuffle; takes effect when the DataLoader (re)creates its workers"""
+        self.epoch = epoch
+
+    @property
+    def columns(self) -> List[str]:
+        return list(dict.fromkeys([self.text_column, self.label_column, self.key_column]))
+
+    def _in_split(self, keys: List[str]) -> np.ndarray:
+        validation = np.array([is_validation_key(key, self.test_size) for key in keys], dtype=bool)
+        return validation if self.split == 'validation' else ~validation
+
+    def _iter_chunks(self, columns: List[str], worker_id: int = 0, num_workers: int = 1) -> Iterator[pd.DataFrame]:
+        for index, chunk in enumerate(iter_records(self.data_path, columns, self.chunk_size)):
+            if index % self.num_replicas == self.rank and (index // self.num_replicas) % num_workers == worker_id:
+                yield chunk
+
+    def __len__(self):
+        """Rows of this split on this replica, counted once with a streaming pass over the key column"""
+        if self._num_rows is None:
+            self._num_rows = sum(
+                int(self._in_split(chunk[self.key_column].astype(str).tolist()).sum())
+                for chunk in self._iter_chunks([self.key_column])
+            )
+        return self._num_rows
+
+    def _iter_rows(self, worker_id: int, num_workers: int) -> Iterator[Dict[str, torch.Tensor]]:
+        for chunk in self._iter_chunks(self.columns, worker_id, num_workers):
+            chunk = chunk[self._in_split(chunk[self.key_column].astype(str).tolist())]
+            if chunk.empty:
+                continue
+            encoded = self.tokenizer(
+                chunk[self.text_column].astype(str).tolist(),
+                truncation=True,
+                max_length=self.max_length
+            )['input_ids']
+            for ids, label in zip(encoded, chunk[self.label_column].astype(int).tolist()):
+                ids = np.asarray(ids, dtype=np.int64)
+                # Apply augmentation if enabled (special tokens stay in place)
+                if self.augment and random.random() < 0.3:  # 30% chance of augmentation
+                    ids = np.concatenate(([ids[0]], augment_token_ids(ids[1:-1], self.is_continuation), [ids[-1]]))
+                yield {
+                    'input_ids': torch.from_numpy(ids),
+                    'attention_mask': torch.ones(len(ids), dtype=torch.long),
+                    'label': torch.tensor(label, dtype=torch.long)
+                }
+
+    def __iter__(self) -> Iterator[Dict[str, torch.Tensor]]:
+        worker = get_worker_info()
+        worker_id, num_workers = (worker.id, worker.num_workers) if worker else (0, 1)
+        rows = self._iter_rows(worker_id, num_workers)
+
+        # Each worker advances its own copy of the epoch counter; keep workers persistent across epochs
+        rng = random.Random(f"{self.seed}-{self.epoch}-{self.rank}-{worker_id}")
+        self.epoch += 1
+        if not self.shuffle_buffer:
+            yield from rows
+            return
+
+        buffer = []
+        for row in rows:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(row)
+                continue
+            index = rng.randrange(len(buffer))
+            yield buffer[index]
+            buffer[index] = row
+        rng.shuffle(buffer)
+        yield from buffer
+
+class PaddingCollator:
+    """Batch variable-length samples, padding only to the longest sequence in the batch"""
+
+    def __init__(self, pad_token_id: int, pad_to_multiple_of: int = 8):
+        """
+        Args:
+            pad_token_id: Id written into padded positions
+            pad_to_multiple_of: Round the padded length up to this multiple (tensor-core friendly)
+        """
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, samples: List[Dict[str, torch.Tensor]]) -> Dict[str, torch.Tensor]:
+        longest = max(len(sample['input_ids']) for sample in samples)
+        width = -(-longest // self.pad_to_multiple_of) * self.pad_to_multiple_of
+
+        input_ids = torch.full((len(samples), width), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(samples), width), dtype=torch.long)
+        for index, sample in enumerate(samples):
+            length = len(sample['input_ids'])
+            input_ids[index, :length] = sample['input_ids']
+            attention_mask[index, :length] = sample['attention_mask']
+
+        return {
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'label': torch.stack([sample['label'] for sample in samples])
+        }
+
+class LengthGroupedSampler(Sampler):
+    """
+    Batch sampler that groups rows of similar length to minimize padding.
+
+    Each epoch shuffles all rows, cuts them into mega-batches of batch_size * mega_batch_factor,
+    sorts each mega-batch by length and splits it into batches, then shuffles the batch order.
+    Batches stay random from epoch to epoch while each one is nearly uniform in length.
+    Without shuffling, batches are simply taken in length order (for evaluation).
+
+    With several replicas every rank builds the same batch list from the shared seed and takes
+    every num_replicas-th batch.
+    """
+
+    def __init__(
+        self,
+        lengths: Sequence[int],
+        batch_size: int,
+        shuffle: bool = True,
+        mega_batch_factor: int = 50,
+        seed: int = 42,
+        num_replicas: int = 1,
+        rank: int = 0,
+        even_batches: bool = True
+    ):
+        """
+        Args:
+            lengths: Token count of every row
+            batch_size: Rows per batch
+            shuffle: Shuffle within mega-batches (training) or keep plain length order (evaluation)
+            mega_batch_factor: Batches per sorted mega-batch
+            seed: Base seed of the shuffle, advanced every epoch
+            num_replicas: Data-parallel replicas sharing the rows
+            rank: This replica's rank
+            even_batches: Repeat a few batches so every replica runs the same number of steps
+        """
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.mega_batch_factor = mega_batch_factor
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.even_batches = even_batches
+        self.epoch = 0
+        self._skip = 0
+
+    def set_epoch(self, epoch: int):
+        """Reseed the shuffle, e.g. to replay a specific epoch"""
+        self.epoch = epoch
+
+    def skip(self, num_batches: int):
+        """Start the next pass after its first num_batches batches (resuming mid-epoch)"""
+        self._skip = num_batches
+
+    def __len__(self):
+        total = -(-len(self.lengths) // self.batch_size)
+        if self.even_batches:
+            return -(-total // self.num_replicas)
+        return len(range(self.rank, total, self.num_replicas))
+
+    def _batches(self) -> List[List[int]]:
+        if not self.shuffle:
+            order = np.argsort(self.lengths, kind='stable')
+            return [order[start:start + self.batch_size].tolist() for start in range(0, len(order), self.batch_size)]
+
+        rng = np.random.default_rng(self.seed + self.epoch)
+        self.epoch += 1
+
+        order = rng.permutation(len(self.lengths))
+        mega_batch_size = self.batch_size * self.mega_batch_factor
+        batches = []
+        for start in range(0, len(order), mega_batch_size):
+            mega_batch = order[start:start + mega_batch_size]
+            mega_batch = mega_batch[np.argsort(-self.lengths[mega_batch], kind='stable')]
+            batches.extend(
+                mega_batch[offset:offset + self.batch_size].tolist()
+                for offset in range(0, len(mega_batch), self.batch_size)
+            )
+        if not batches:
+            return batches
+
+        # Run the longest batch first so an out-of-memory error surfaces immediately
+        longest = max(range(len(batches)), key=lambda index: self.lengths[batches[index][0]])
+        batches[0], batches[longest] = batches[longest], batches[0]
+        rest = batches[1:]
+        rng.shuffle(rest)
+        return [batches[0]] + rest
+
+    def __iter__(self) -> Iterator[List[int]]:
+        batches = self._batches()
+        if self.num_replicas > 1:
+            if self.even_batches and batches:
+                padding = -len(batches) % self.num_replicas
+                batches += (batches * (padding // len(batches) + 1))[:padding]
+            batches = batches[self.rank::self.num_replicas]
+        skip, self._skip = self._skip, 0
+        yield from batches[skip:]
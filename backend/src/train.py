@@ -1,7 +1,7 @@
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, DistributedSampler
 from transformers import (
-    DistilBertTokenizer,
+    DistilBertTokenizerFast,
     DistilBertForSequenceClassification,
     AdamW,
     get_linear_schedule_with_warmup
@@ -12,16 +12,45 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix
 import logging
 import os
-from typing import List, Dict, Tuple, Any
+import shutil
+from typing import List, Dict, Tuple, Any, Optional
 import json
 from datetime import datetime
 from tqdm import tqdm
-import nltk
 from nltk.tokenize import word_tokenize
 import random
+import zlib
+import itertools
+
+from heads import CategoryHead, EarlyExitHeads, mean_pool
+from lexical_model import LexicalClassifier, cascade_coverage
+from weights_io import load_weights, save_weights, state_dict_digest
+from checkpointing import BEST_WEIGHTS_NAME, CheckpointManager, get_rng_state, set_rng_state
+from startup import ensure_punkt
+from distributed import (
+    all_gather_list,
+    all_reduce_sum,
+    barrier,
+    broadcast_module,
+    broadcast_object,
+    cleanup_distributed,
+    get_local_rank,
+    get_rank,
+    get_world_size,
+    init_distributed,
+    is_main_process,
+    join,
+    wrap_model
+)
+from token_dataset import (
+    LengthGroupedSampler,
+    PaddingCollator,
+    StreamingTextDataset,
+    TokenizedDataset,
+    build_token_cache,
+    load_token_cache_meta
+)
 
-# Download required NLTK data
-nltk.download('punkt')
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -70,13 +99,20 @@ class TextAugmenter:
         return ' '.join(words)
 
 class TextDataset(Dataset):
-    def __init__(self, texts: List[str], labels: List[int], tokenizer, max_length: int = 512, augment: bool = False):
+    def __init__(self, texts: List[str], labels: List[Any], tokenizer, max_length: int = 512, augment: bool = False,
+                 label_dtype: torch.dtype = torch.long, pad_to_max_length: bool = True):
         self.texts = texts
         self.labels = labels
         self.tokenizer = tokenizer
         self.max_length = max_length
         self.augment = augment
+        self.label_dtype = label_dtype
+        # Without fixed padding, batch with PaddingCollator
+        self.pad_to_max_length = pad_to_max_length
         self.augmenter = TextAugmenter()
+        if augment:
+            # Augmentation tokenizes words with punkt
+            ensure_punkt()
 
     def __len__(self):
         return len(self.texts)
@@ -96,7 +132,7 @@ class TextDataset(Dataset):
         encoding = self.tokenizer(
             text,
             truncation=True,
-            padding='max_length',
+            padding='max_length' if self.pad_to_max_length else False,
             max_length=self.max_length,
             return_tensors='pt'
         )
@@ -104,9 +140,22 @@ class TextDataset(Dataset):
         return {
             'input_ids': encoding['input_ids'].flatten(),
             'attention_mask': encoding['attention_mask'].flatten(),
-            'label': torch.tensor(label, dtype=torch.long)
+            'label': torch.tensor(label, dtype=self.label_dtype)
         }
 
+class _ExitHeadsLoss(torch.nn.Module):
+    """Summed loss of every exit head in a single forward call, so DistributedDataParallel can wrap it"""
+
+    def __init__(self, exit_heads: EarlyExitHeads):
+        super().__init__()
+        self.exit_heads = exit_heads
+
+    def forward(self, hidden_states: Tuple[torch.Tensor, ...], labels: torch.Tensor) -> torch.Tensor:
+        return sum(
+            torch.nn.functional.cross_entropy(self.exit_heads(index, states), labels)
+            for index, states in enumerate(hidden_states)
+        )
+
 class ModelTrainer:
     def __init__(
         self,
@@ -118,7 +167,8 @@ class ModelTrainer:
         num_epochs: int = 3,
         warmup_steps: int = 0,
         device: str = None,
-        use_augmentation: bool = True
+        use_augmentation: bool = True,
+        train_exit_heads: bool = False
     ):
         self.model_name = model_name
         self.num_labels = num_labels
@@ -128,15 +178,21 @@ class ModelTrainer:
         self.num_epochs = num_epochs
         self.warmup_steps = warmup_steps
         self.device = device or ('cuda' if torch.cuda.is_available() else 'cpu')
+        # Data-parallel replicas (launched with torchrun and joined via init_distributed) split the data
+        self.rank = get_rank()
+        self.world_size = get_world_size()
+        if self.world_size > 1 and self.device == 'cuda':
+            self.device = f"cuda:{get_local_rank()}"
         self.use_augmentation = use_augmentation
+        self.train_exit_heads = train_exit_heads
         
-        self.tokenizer = DistilBertTokenizer.from_pretrained(model_name)
+        self.tokenizer = DistilBertTokenizerFast.from_pretrained(model_name)
         self.model = DistilBertForSequenceClassification.from_pretrained(
             model_name,
             num_labels=num_labels
         ).to(self.device)
         
-        logger.info(f"Using device: {self.device}")
+        logger.info(f"Using device: {self.device} (rank {self.rank} of {self.world_size})")
         logger.info(f"Augmentation enabled: {self.use_augmentation}")
 
     def prepare_data(
@@ -144,47 +200,160 @@ class ModelTrainer:
         data_path: str,
         text_column: str,
         label_column: str,
-        test_size: float = 0.2
+        test_size: float = 0.2,
+        cache_dir: str = 'data/token_cache',
+        group_by_length: bool = True,
+        streaming: bool = False,
+        shuffle_buffer: int = 10000,
+        key_column: Optional[str] = None
     ) -> Tuple[DataLoader, DataLoader]:
-        """Prepare training and validation data loaders"""
-        
-        # Load and preprocess data
-        df = pd.read_csv(data_path)
-        texts = df[text_column].tolist()
-        labels = df[label_column].tolist()
+        """
+        Prepare training and validation data loaders from a CSV, Parquet or JSON Lines file.
+
+        By default the file is tokenized once into a memory-mapped cache and split at random.
+        With streaming=True it is instead read in chunks on every pass and split by hashing
+        key_column (the text by default), so memory use does not grow with the file size.
+        """
+        if streaming:
+            return self._prepare_streaming_data(
+                data_path, text_column, label_column, test_size, shuffle_buffer, key_column
+            )
+
+        # Tokenize once per host, on its local rank 0; later runs on the same data and tokenizer reuse
+        # the cache. Every host needs its own copy of data_path, and since the cache is named after the
+        # file's contents, rank 0's path also names the cache on the other hosts.
+        local_path = None
+        if get_local_rank() == 0:
+            local_path = build_token_cache(
+                data_path, text_column, label_column, self.tokenizer, self.max_length, cache_dir
+            )
+        cache_path = broadcast_object(local_path)
+        # Also waits for every host's cache to be complete
+        mismatched, = all_reduce_sum([float(local_path is not None and local_path != cache_path)])
+        if mismatched:
+            raise ValueError(f"{data_path} differs between hosts; every host needs the same file")
+        num_rows = load_token_cache_meta(cache_path)['rows']
 
         # Split data
-        train_texts, val_texts, train_labels, val_labels = train_test_split(
-            texts, labels, test_size=test_size, random_state=42
+        train_indices, val_indices = train_test_split(
+            np.arange(num_rows), test_size=test_size, random_state=42
         )
 
         # Create datasets
-        train_dataset = TextDataset(train_texts, train_labels, self.tokenizer, self.max_length, self.use_augmentation)
-        val_dataset = TextDataset(val_texts, val_labels, self.tokenizer, self.max_length, self.use_augmentation)
+        train_dataset = TokenizedDataset(cache_path, train_indices, self.tokenizer, self.use_augmentation)
+        # Each replica evaluates a disjoint slice; a padding sampler would count some rows twice
+        val_dataset = TokenizedDataset(cache_path, val_indices[self.rank::self.world_size], self.tokenizer)
+
+        # Create data loaders; batches are padded only to their longest row, and each replica gets a shard
+        collator = PaddingCollator(self.tokenizer.pad_token_id)
+        replicas = {'num_replicas': self.world_size, 'rank': self.rank}
+        if group_by_length:
+            train_loader = DataLoader(
+                train_dataset,
+                batch_sampler=LengthGroupedSampler(train_dataset.get_lengths(), self.batch_size, **replicas),
+                collate_fn=collator,
+                num_workers=2
+            )
+            val_loader = DataLoader(
+                val_dataset,
+                batch_sampler=LengthGroupedSampler(val_dataset.get_lengths(), self.batch_size, shuffle=False),
+                collate_fn=collator,
+                num_workers=2
+            )
+        else:
+            # DistributedSampler (also with one replica) seeds its shuffle per epoch, so a resumed
+            # run can replay an epoch's order exactly
+            train_loader = DataLoader(
+                train_dataset,
+                batch_size=self.batch_size,
+                sampler=DistributedSampler(train_dataset, shuffle=True, seed=42, **replicas),
+                collate_fn=collator,
+                num_workers=2
+            )
+            val_loader = DataLoader(
+                val_dataset,
+                batch_size=self.batch_size,
+                shuffle=False,
+                collate_fn=collator,
+                num_workers=2
+            )
+
+        return train_loader, val_loader
+
+    def _prepare_streaming_data(
+        self,
+        data_path: str,
+        text_column: str,
+        label_column: str,
+        test_size: float,
+        shuffle_buffer: int,
+        key_column: Optional[str]
+    ) -> Tuple[DataLoader, DataLoader]:
+        """Data loaders that stream and tokenize the file instead of loading it"""
+        options = {
+            'max_length': self.max_length,
+            'test_size': test_size,
+            'key_column': key_column,
+            'num_replicas': self.world_size,
+            'rank': self.rank
+        }
+        train_dataset = StreamingTextDataset(
+            data_path, text_column, label_column, self.tokenizer,
+            split='train', shuffle_buffer=shuffle_buffer, augment=self.use_augmentation, **options
+        )
+        val_dataset = StreamingTextDataset(
+            data_path, text_column, label_column, self.tokenizer,
+            split='validation', shuffle_buffer=0, **options
+        )
 
-        # Create data loaders
+        # Persistent workers keep their dataset copy, so the shuffle changes from epoch to epoch
+        collator = PaddingCollator(self.tokenizer.pad_token_id)
         train_loader = DataLoader(
             train_dataset,
             batch_size=self.batch_size,
-            shuffle=True,
-            num_workers=2
+            collate_fn=collator,
+            num_workers=2,
+            persistent_workers=True
         )
         val_loader = DataLoader(
             val_dataset,
             batch_size=self.batch_size,
-            shuffle=False,
-            num_workers=2
+            collate_fn=collator,
+            num_workers=2,
+            persistent_workers=True
         )
 
         return train_loader, val_loader
 
+    def _set_epoch(self, loader: DataLoader, epoch: int, start_step: int = 0):
+        """Position a loader's shuffle at an epoch, skipping batches already trained on when resuming"""
+        for source in (loader.batch_sampler, loader.sampler, loader.dataset):
+            if hasattr(source, 'set_epoch'):
+                source.set_epoch(epoch)
+        if start_step and hasattr(loader.batch_sampler, 'skip'):
+            loader.batch_sampler.skip(start_step)
+            return iter(loader)
+        # Other samplers replay the epoch's order and drop the batches that were already seen
+        return itertools.islice(loader, start_step, None)
+
     def train(
         self,
         train_loader: DataLoader,
         val_loader: DataLoader,
-        save_dir: str = 'weights'
+        save_dir: str = 'weights',
+        checkpoints: Optional[CheckpointManager] = None,
+        checkpoint_every: int = 500
     ) -> Dict:
-        """Train the model and return training history"""
+        """
+        Train the model and return training history (identical on every replica).
+
+        Args:
+            train_loader: Training batches
+            val_loader: Validation batches
+            save_dir: Directory for the best weights and the training history
+            checkpoints: Where to write periodic checkpoints; training resumes from its latest one
+            checkpoint_every: Optimizer steps between mid-epoch checkpoints (one is also written after every epoch)
+        """
         
         # Prepare optimizer and scheduler
         optimizer = AdamW(self.model.parameters(), lr=self.learning_rate)
@@ -205,48 +374,122 @@ class ModelTrainer:
         # Create save directory if it doesn't exist
         os.makedirs(save_dir, exist_ok=True)
 
-        # Training loop
         best_val_accuracy = 0.0
-        for epoch in range(self.num_epochs):
+        start_epoch, start_step, global_step = 0, 0, 0
+        resumed_loss = [0.0, 0]
+
+        best_weights_path = os.path.join(save_dir, 'toxic_classifier.safetensors')
+
+        # Resume from the latest checkpoint; rank 0 finds (or downloads) it and hands the state to
+        # the other replicas, which may run on hosts that cannot see the checkpoint directory
+        if checkpoints is not None:
+            state = None
+            if is_main_process():
+                latest = checkpoints.latest()
+                if latest:
+                    model_state, state = CheckpointManager.load(latest, self.device)
+                    if state['epoch'] >= self.num_epochs:
+                        # Left behind by a run that finished; start over instead of returning its weights
+                        logger.info(f"Ignoring {latest}, which belongs to a finished run")
+                        state = None
+                        checkpoints.clear()
+                    else:
+                        self.model.load_state_dict(model_state)
+                        # The best weights so far travel with the checkpoint, matching best_val_accuracy
+                        best_in_checkpoint = os.path.join(latest, BEST_WEIGHTS_NAME)
+                        if os.path.exists(best_in_checkpoint):
+                            shutil.copyfile(best_in_checkpoint, best_weights_path)
+                        logger.info(f"Resuming from {latest}")
+            state = broadcast_object(state)
+            if state is not None:
+                broadcast_module(self.model)
+                optimizer.load_state_dict(state['optimizer'])
+                scheduler.load_state_dict(state['scheduler'])
+                history = state['history']
+                best_val_accuracy = state['best_val_accuracy']
+                start_epoch, start_step, global_step = state['epoch'], state['step_in_epoch'], state['global_step']
+                set_rng_state(state['rng'])
+                if is_main_process():
+                    # The running loss is rank 0's partial sum; adding it on one rank keeps the all-reduce exact
+                    resumed_loss = [state['train_loss'], state['train_batches']]
+                logger.info(f"Resumed at epoch {start_epoch + 1}, step {start_step}")
+
+        def save_checkpoint(epoch: int, step_in_epoch: int, train_loss: float, train_batches: int):
+            # Replicas hold identical weights, so rank 0 writes it; other replicas do not wait
+            if checkpoints is None or not is_main_process():
+                return
+            files = {BEST_WEIGHTS_NAME: best_weights_path} if os.path.exists(best_weights_path) else None
+            checkpoints.save(global_step, self.model.state_dict(), {
+                'epoch': epoch,
+                'step_in_epoch': step_in_epoch,
+                'global_step': global_step,
+                'optimizer': optimizer.state_dict(),
+                'scheduler': scheduler.state_dict(),
+                'history': history,
+                'best_val_accuracy': best_val_accuracy,
+                'train_loss': train_loss,
+                'train_batches': train_batches,
+                'rng': get_rng_state()
+            }, files)
+
+        # Gradients are all-reduced across replicas during backward
+        model = wrap_model(self.model)
+
+        # Training loop
+        for epoch in range(start_epoch, self.num_epochs):
             logger.info(f"Epoch {epoch + 1}/{self.num_epochs}")
+            first_step = start_step if epoch == start_epoch else 0
+            batches = self._set_epoch(train_loader, epoch, first_step)
             
             # Training phase
-            self.model.train()
-            train_loss = 0
-            progress_bar = tqdm(train_loader, desc=f"Training")
+            model.train()
+            train_loss, train_batches = resumed_loss if epoch == start_epoch else (0.0, 0)
+            step_in_epoch = first_step
+            progress_bar = tqdm(
+                batches, desc=f"Training", total=len(train_loader), initial=first_step, disable=not is_main_process()
+            )
             
-            for batch in progress_bar:
-                optimizer.zero_grad()
-                
-                input_ids = batch['input_ids'].to(self.device)
-                attention_mask = batch['attention_mask'].to(self.device)
-                labels = batch['label'].to(self.device)
+            with join(model):
+                for batch in progress_bar:
+                    optimizer.zero_grad()
+                    
+                    input_ids = batch['input_ids'].to(self.device)
+                    attention_mask = batch['attention_mask'].to(self.device)
+                    labels = batch['label'].to(self.device)
 
-                outputs = self.model(
-                    input_ids=input_ids,
-                    attention_mask=attention_mask,
-                    labels=labels
-                )
+                    outputs = model(
+                        input_ids=input_ids,
+                        attention_mask=attention_mask,
+                        labels=labels
+                    )
 
-                loss = outputs.loss
-                loss.backward()
-                optimizer.step()
-                scheduler.step()
+                    loss = outputs.loss
+                    loss.backward()
+                    optimizer.step()
+                    scheduler.step()
 
-                train_loss += loss.item()
-                progress_bar.set_postfix({'loss': loss.item()})
+                    train_loss += loss.item()
+                    train_batches += 1
+                    step_in_epoch += 1
+                    global_step += 1
+                    progress_bar.set_postfix({'loss': loss.item()})
+
+                    if checkpoint_every and global_step % checkpoint_every == 0:
+                        save_checkpoint(epoch, step_in_epoch, train_loss, train_batches)
 
-            avg_train_loss = train_loss / len(train_loader)
+            train_loss, train_batches = all_reduce_sum([train_loss, train_batches])
+            avg_train_loss = train_loss / max(train_batches, 1)
             history['train_loss'].append(avg_train_loss)
 
-            # Validation phase
+            # Validation phase (each replica scores its shard, the sums are combined)
             self.model.eval()
             val_loss = 0
+            val_batches = 0
             correct_predictions = 0
             total_predictions = 0
 
             with torch.no_grad():
-                for batch in tqdm(val_loader, desc="Validation"):
+                for batch in tqdm(val_loader, desc="Validation", disable=not is_main_process()):
                     input_ids = batch['input_ids'].to(self.device)
                     attention_mask = batch['attention_mask'].to(self.device)
                     labels = batch['label'].to(self.device)
@@ -258,11 +501,15 @@ class ModelTrainer:
                     )
 
                     val_loss += outputs.loss.item()
+                    val_batches += 1
                     predictions = torch.argmax(outputs.logits, dim=1)
                     correct_predictions += (predictions == labels).sum().item()
                     total_predictions += labels.shape[0]
 
-            avg_val_loss = val_loss / len(val_loader)
+            val_loss, val_batches, correct_predictions, total_predictions = all_reduce_sum(
+                [val_loss, val_batches, correct_predictions, total_predictions]
+            )
+            avg_val_loss = val_loss / max(val_batches, 1)
             val_accuracy = correct_predictions / total_predictions
             
             history['val_loss'].append(avg_val_loss)
@@ -271,27 +518,178 @@ class ModelTrainer:
             logger.info(f"Epoch {epoch + 1} - Train Loss: {avg_train_loss:.4f}, "
                        f"Val Loss: {avg_val_loss:.4f}, Val Accuracy: {val_accuracy:.4f}")
 
-            # Save best model
-            if val_accuracy > best_val_accuracy:
-                best_val_accuracy = val_accuracy
-                torch.save(
-                    self.model.state_dict(),
-                    os.path.join(save_dir, 'toxic_classifier.pt')
+            # Replicas hold identical weights, so only rank 0 writes checkpoints
+            if is_main_process():
+                # Save best model
+                if val_accuracy > best_val_accuracy:
+                    save_weights(self.model.state_dict(), best_weights_path)
+                    logger.info(f"Saved best model with validation accuracy: {val_accuracy:.4f}")
+
+                # Save training history
+                with open(os.path.join(save_dir, 'training_history.json'), 'w') as f:
+                    json.dump(history, f)
+            best_val_accuracy = max(best_val_accuracy, val_accuracy)
+
+            # A completed epoch resumes at the start of the next one
+            save_checkpoint(epoch + 1, 0, 0.0, 0)
+            barrier()
+
+        if checkpoints is not None:
+            checkpoints.wait()
+
+        if self.train_exit_heads:
+            # Exit heads must match the encoder that is actually served
+            if is_main_process():
+                self.model.load_state_dict(load_weights(best_weights_path, self.device)[0])
+            broadcast_module(self.model)
+            history['exit_head_accuracy'] = self.fit_exit_heads(train_loader, val_loader, save_dir=save_dir)
+
+        return history
+
+    def fit_exit_heads(
+        self,
+        train_loader: DataLoader,
+        val_loader: DataLoader,
+        num_epochs: int = 1,
+        learning_rate: float = 1e-3,
+        head_size: int = 128,
+        save_dir: str = 'weights'
+    ) -> List[float]:
+        """Train early-exit classifiers on the frozen intermediate layers and return their val accuracy"""
+        config = self.model.config
+        exit_heads = EarlyExitHeads(config.dim, config.n_layers, config.num_labels, head_size).to(self.device)
+        optimizer = torch.optim.AdamW(exit_heads.parameters(), lr=learning_rate)
+        exit_loss = wrap_model(_ExitHeadsLoss(exit_heads))
+        encoder = self.model.distilbert
+        encoder.eval()
+
+        def intermediate_states(batch):
+            with torch.no_grad():
+                outputs = encoder(
+                    input_ids=batch['input_ids'].to(self.device),
+                    attention_mask=batch['attention_mask'].to(self.device),
+                    output_hidden_states=True
                 )
-                logger.info(f"Saved best model with validation accuracy: {val_accuracy:.4f}")
+            # hidden_states[0] is the embedding output; exits follow layers 1..n-1
+            return outputs.hidden_states[1:-1]
+
+        for epoch in range(num_epochs):
+            exit_heads.train()
+            with join(exit_loss):
+                for batch in tqdm(train_loader, desc=f"Exit heads {epoch + 1}/{num_epochs}", disable=not is_main_process()):
+                    labels = batch['label'].to(self.device)
+                    optimizer.zero_grad()
+                    loss = exit_loss(intermediate_states(batch), labels)
+                    loss.backward()
+                    optimizer.step()
+
+        exit_heads.eval()
+        correct = [0] * len(exit_heads.exits)
+        total = 0
+        with torch.no_grad():
+            for batch in tqdm(val_loader, desc="Exit head validation", disable=not is_main_process()):
+                labels = batch['label'].to(self.device)
+                for index, states in enumerate(intermediate_states(batch)):
+                    correct[index] += (exit_heads(index, states).argmax(dim=1) == labels).sum().item()
+                total += labels.shape[0]
+        *correct, total = all_reduce_sum(correct + [total])
+
+        accuracy = [count / total for count in correct] if total else []
+        for index, value in enumerate(accuracy):
+            logger.info(f"Exit head after layer {index + 1}: val accuracy {value:.4f}")
+
+        if is_main_process():
+            os.makedirs(save_dir, exist_ok=True)
+            save_weights(
+                exit_heads.state_dict(),
+                os.path.join(save_dir, 'exit_heads.safetensors'),
+                {'head_size': head_size, 'classifier_digest': state_dict_digest(self.model.state_dict())}
+            )
+            logger.info("Saved early-exit heads")
+        barrier()
+
+        return accuracy
+
+    def train_category_head(
+        self,
+        data_path: str,
+        text_column: str,
+        category_columns: List[str],
+        num_epochs: int = 3,
+        learning_rate: float = 1e-3,
+        save_dir: str = 'weights'
+    ) -> Dict:
+        """Train the multi-label category head on frozen encoder features"""
+        df = pd.read_csv(data_path)
+        texts = df[text_column].astype(str).tolist()
+        labels = df[category_columns].astype(float).values.tolist()
+
+        dataset = TextDataset(texts, labels, self.tokenizer, self.max_length, label_dtype=torch.float, pad_to_max_length=False)
+        sampler = DistributedSampler(dataset, self.world_size, self.rank) if self.world_size > 1 else None
+        loader = DataLoader(
+            dataset,
+            batch_size=self.batch_size,
+            shuffle=sampler is None,
+            sampler=sampler,
+            collate_fn=PaddingCollator(self.tokenizer.pad_token_id),
+            num_workers=2
+        )
+
+        # Only the head is trained; the encoder is shared with the toxicity classifier
+        encoder = self.model.distilbert
+        encoder.eval()
+        head = CategoryHead(self.model.config.dim, category_columns).to(self.device)
+        optimizer = torch.optim.AdamW(head.parameters(), lr=learning_rate)
+        loss_fn = torch.nn.BCEWithLogitsLoss()
+        model = wrap_model(head)
+
+        history = {'train_loss': []}
+        for epoch in range(num_epochs):
+            if sampler is not None:
+                sampler.set_epoch(epoch)
+            head.train()
+            train_loss = 0
+            progress_bar = tqdm(loader, desc=f"Category head {epoch + 1}/{num_epochs}", disable=not is_main_process())
 
-            # Save training history
-            with open(os.path.join(save_dir, 'training_history.json'), 'w') as f:
-                json.dump(history, f)
+            for batch in progress_bar:
+                input_ids = batch['input_ids'].to(self.device)
+                attention_mask = batch['attention_mask'].to(self.device)
+                labels = batch['label'].to(self.device)
+
+                with torch.no_grad():
+                    hidden_states = encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+                    pooled = mean_pool(hidden_states, attention_mask)
+
+                optimizer.zero_grad()
+                loss = loss_fn(model(pooled), labels)
+                loss.backward()
+                optimizer.step()
+
+                train_loss += loss.item()
+                progress_bar.set_postfix({'loss': loss.item()})
+
+            train_loss, train_batches = all_reduce_sum([train_loss, len(loader)])
+            history['train_loss'].append(train_loss / train_batches)
+
+        if is_main_process():
+            os.makedirs(save_dir, exist_ok=True)
+            save_weights(
+                head.state_dict(),
+                os.path.join(save_dir, 'category_head.safetensors'),
+                {'categories': head.categories, 'classifier_digest': state_dict_digest(self.model.state_dict())}
+            )
+            logger.info(f"Saved category head for categories: {head.categories}")
+        barrier()
 
         return history
 
     def evaluate_model(self, val_loader: DataLoader) -> Dict[str, Any]:
-        """Evaluate model performance"""
+        """Evaluate model performance over the validation shards of every replica"""
         self.model.eval()
         all_predictions = []
         all_labels = []
         val_loss = 0
+        val_batches = 0
 
         with torch.no_grad():
             for batch in val_loader:
@@ -306,10 +704,15 @@ class ModelTrainer:
                 )
 
                 val_loss += outputs.loss.item()
+                val_batches += 1
                 predictions = torch.argmax(outputs.logits, dim=1)
                 
-                all_predictions.extend(predictions.cpu().numpy())
-                all_labels.extend(labels.cpu().numpy())
+                all_predictions.extend(predictions.cpu().tolist())
+                all_labels.extend(labels.cpu().tolist())
+
+        all_predictions = all_gather_list(all_predictions)
+        all_labels = all_gather_list(all_labels)
+        val_loss, val_batches = all_reduce_sum([val_loss, val_batches])
 
         # Calculate metrics
         report = classification_report(all_labels, all_predictions, output_dict=True)
@@ -318,15 +721,17 @@ class ModelTrainer:
         return {
             'classification_report': report,
             'confusion_matrix': conf_matrix.tolist(),
-            'val_loss': val_loss / len(val_loader)
+            'val_loss': val_loss / max(val_batches, 1)
         }
 
     def save_model(self, save_dir: str, metrics: Dict[str, Any]):
-        """Save model, tokenizer, and training metrics"""
+        """Save model, tokenizer, and training metrics (rank 0 only when distributed)"""
+        if not is_main_process():
+            return
         os.makedirs(save_dir, exist_ok=True)
         
-        # Save model
-        self.model.save_pretrained(os.path.join(save_dir, 'model'))
+        # Save model as safetensors so serving workers can memory-map it
+        self.model.save_pretrained(os.path.join(save_dir, 'model'), safe_serialization=True)
         self.tokenizer.save_pretrained(os.path.join(save_dir, 'tokenizer'))
         
         # Save metrics
@@ -339,14 +744,67 @@ class ModelTrainer:
             'learning_rate': self.learning_rate,
             'num_epochs': self.num_epochs,
             'device': str(self.device),
-            'use_augmentation': self.use_augmentation
+            'use_augmentation': self.use_augmentation,
+            'train_exit_heads': self.train_exit_heads,
+            'world_size': self.world_size
         }
         
         with open(os.path.join(save_dir, 'metrics.json'), 'w') as f:
             json.dump(metrics, f, indent=2)
 
+def train_lexical_model(
+    data_path: str,
+    text_column: str,
+    label_column: str,
+    save_path: str = 'weights/lexical_model.pkl',
+    chunk_size: int = 100000,
+    validation_percent: int = 20,
+    num_epochs: int = 2,
+    approve_below: float = 0.05,
+    reject_above: float = 0.98
+) -> Dict[str, Any]:
+    """Train the hashed n-gram first-stage classifier from the same CSV, streaming it in chunks"""
+    model = LexicalClassifier()
+
+    def is_validation(text: str) -> bool:
+        # Stable hash split so repeated passes see the same validation rows
+        return zlib.crc32(text.encode('utf-8')) % 100 < validation_percent
+
+    for epoch in range(num_epochs):
+        for chunk in pd.read_csv(data_path, usecols=[text_column, label_column], chunksize=chunk_size):
+            texts = chunk[text_column].astype(str).tolist()
+            labels = chunk[label_column].astype(int).tolist()
+            train_rows = [(text, label) for text, label in zip(texts, labels) if not is_validation(text)]
+            if train_rows:
+                model.partial_fit([text for text, _ in train_rows], [label for _, label in train_rows])
+        logger.info(f"Lexical model epoch {epoch + 1}/{num_epochs} complete")
+
+    probabilities, val_labels = [], []
+    for chunk in pd.read_csv(data_path, usecols=[text_column, label_column], chunksize=chunk_size):
+        texts = chunk[text_column].astype(str).tolist()
+        labels = chunk[label_column].astype(int).tolist()
+        val_rows = [(text, label) for text, label in zip(texts, labels) if is_validation(text)]
+        if val_rows:
+            probabilities.extend(model.predict_proba([text for text, _ in val_rows]))
+            val_labels.extend(label for _, label in val_rows)
+
+    metrics = cascade_coverage(np.array(probabilities), val_labels, approve_below, reject_above)
+    logger.info(f"Lexical model cascade coverage on validation split: {metrics}")
+
+    model.save(save_path)
+    return metrics
+
 def main():
-    """Main training function"""
+    """
+    Main training function.
+
+    Runs as a single process, or data-parallel under torchrun, e.g. 4 replicas on one host:
+        torchrun --standalone --nproc_per_node=4 train.py
+    or across hosts, each with its own copy of the data file:
+        torchrun --nnodes=2 --node_rank=<0|1> --nproc_per_node=8 --master_addr=<host0> --master_port=29500 train.py
+    """
+    init_distributed()
+
     # Training configuration
     config = {
         'model_name': 'distilbert-base-uncased',
@@ -357,11 +815,13 @@ def main():
         'num_epochs': 3,
         'warmup_steps': 0,
         'save_dir': 'weights',
-        'use_augmentation': True
+        'checkpoint_dir': 'checkpoints',
+        'use_augmentation': True,
+        'train_exit_heads': True
     }
 
-    # Initialize trainer
-    trainer = ModelTrainer(**config)
+    # Initialize trainer (save_dir and checkpoint_dir are train() arguments, not constructor ones)
+    trainer = ModelTrainer(**{key: value for key, value in config.items() if key not in ('save_dir', 'checkpoint_dir')})
 
     # Prepare data
     train_loader, val_loader = trainer.prepare_data(
@@ -371,8 +831,13 @@ def main():
         test_size=0.2
     )
 
-    # Train model
-    history = trainer.train(train_loader, val_loader, config['save_dir'])
+    # Train model, resuming from the latest checkpoint if an earlier run was interrupted
+    checkpoints = CheckpointManager(config['checkpoint_dir'])
+    history = trainer.train(train_loader, val_loader, config['save_dir'], checkpoints=checkpoints)
+    # Only interrupted runs are resumed; the next run starts from scratch
+    if is_main_process():
+        checkpoints.clear()
+    checkpoints.close()
     
     # Log final results
     logger.info("Training completed!")
@@ -387,5 +852,16 @@ def main():
     # Save model
     trainer.save_model(config['save_dir'], metrics)
 
+    # Train the first-stage lexical model that gates the transformer
+    if is_main_process():
+        train_lexical_model(
+            data_path='data/toxic_comments.csv',
+            text_column='text',
+            label_column='is_toxic',
+            save_path=os.path.join(config['save_dir'], 'lexical_model.pkl')
+        )
+
+    cleanup_distributed()
+
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import logging
+import os
+import struct
+from typing import Any, Dict, Optional, Tuple
+
+import torch
+from safetensors.torch import load_file, save_file
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_DTYPES = {
+    'F64': torch.float64,
+    'F32': torch.float32,
+    'F16': torch.float16,
+    'BF16': torch.bfloat16,
+    'I64': torch.int64,
+    'I32': torch.int32,
+    'I16': torch.int16,
+    'I8': torch.int8,
+    'U8': torch.uint8,
+    'BOOL': torch.bool
+}
+
+# (start, end) addresses of safetensors files mapped by _mmap_safetensors
+_mapped_ranges = []
+
+def is_memory_mapped(tensor: torch.Tensor) -> bool:
+    """Whether a tensor's data lives in a file mapping created by load_weights"""
+    address = tensor.data_ptr()
+    return any(start <= address < end for start, end in _mapped_ranges)
+
+def _decode_metadata(value: str) -> Any:
+    """Metadata written by save_weights is JSON; other writers (e.g. save_pretrained) store plain strings"""
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+def state_dict_digest(state_dict: Dict[str, torch.Tensor]) -> str:
+    """SHA-256 over tensor names, dtypes, shapes and values; identifies weights however they were stored"""
+    digest = hashlib.sha256()
+    for name in sorted(state_dict):
+        tensor = state_dict[name].detach().cpu().contiguous()
+        digest.update(f"{name}:{tensor.dtype}:{tuple(tensor.shape)}".encode('utf-8'))
+        digest.update(tensor.reshape(-1).view(torch.uint8).numpy().tobytes())
+    return digest.hexdigest()
+
+def find_weights(directory: str, name: str) -> Optional[str]:
+    """Path of a weights file, preferring safetensors over a legacy torch.save checkpoint"""
+    for extension in ('.safetensors', '.pt'):
+        path = os.path.join(directory, f"{name}{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+def save_weights(state_dict: Dict[str, torch.Tensor], path: str, metadata: Optional[Dict[str, Any]] = None):
+    """Write a state dict as safetensors atomically; metadata values are stored as JSON"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tensors = {name: tensor.detach().cpu().contiguous() for name, tensor in state_dict.items()}
+    tmp_path = f"{path}.tmp"
+    save_file(tensors, tmp_path, metadata={key: json.dumps(value) for key, value in (metadata or {}).items()})
+    os.replace(tmp_path, path)
+    logger.info(f"Saved weights to {path}")
+
+def _mmap_safetensors(path: str) -> Tuple[Dict[str, torch.Tensor], Dict[str, str]]:
+    """
+    View every tensor in a safetensors file directly over a private file mapping.
+
+    Nothing is copied: pages come from the OS page cache, so processes on one host
+    loading the same file share the memory until a tensor is written to.
+    """
+    with open(path, 'rb') as f:
+        header_size = struct.unpack('<Q', f.read(8))[0]
+        header = json.loads(f.read(header_size))
+
+    metadata = header.pop('__metadata__', None) or {}
+    storage = torch.UntypedStorage.from_file(path, False, os.path.getsize(path))
+    _mapped_ranges.append((storage.data_ptr(), storage.data_ptr() + storage.nbytes()))
+    data_start = 8 + header_size
+
+    tensors = {}
+    for name, info in header.items():
+        dtype = _DTYPES[info['dtype']]
+        start, _ = info['data_offsets']
+        itemsize = torch.empty((), dtype=dtype).element_size()
+        if (data_start + start) % itemsize:
+            raise ValueError(f"Tensor {name} is not aligned for zero-copy loading")
+        tensors[name] = torch.empty(0, dtype=dtype).set_(
+            storage,
+            (data_start + start) // itemsize,
+            info['shape']
+        )
+    return tensors, metadata
+
+def load_weights(path: str, device: Any = 'cpu') -> Tuple[Dict[str, torch.Tensor], Dict[str, Any]]:
+    """
+    Load a state dict and its metadata.
+
+    Safetensors files on CPU are memory-mapped zero-copy; other devices copy from the
+    mapping. Legacy torch.save checkpoints ({'state_dict': ..., **metadata} or a bare
+    state dict) are still read.
+    """
+    if not path.endswith('.safetensors'):
+        checkpoint = torch.load(path, map_location=device)
+        if 'state_dict' in checkpoint:
+            return checkpoint.pop('state_dict'), checkpoint
+        return checkpoint, {}
+
+    try:
+        tensors, metadata = _mmap_safetensors(path)
+    except (ValueError, KeyError, RuntimeError) as e:
+        logger.warning(f"Falling back to copying load for {path}: {str(e)}")
+        tensors = load_file(path)
+        with open(path, 'rb') as f:
+            header_size = struct.unpack('<Q', f.read(8))[0]
+            metadata = json.loads(f.read(header_size)).get('__metadata__') or {}
+
+    if str(device) != 'cpu':
+        tensors = {name: tensor.to(device) for name, tensor in tensors.items()}
+    return tensors, {key: _decode_metadata(value) for key, value in metadata.items()}
+
+def convert_to_safetensors(path: str, target: Optional[str] = None) -> str:
+    """Rewrite a torch.save checkpoint as safetensors (next to it by default) and return the new path"""
+    state_dict, metadata = load_weights(path)
+    target = target or f"{os.path.splitext(path)[0]}.safetensors"
+    save_weights(state_dict, target, metadata)
+    return target